@@ -1,3 +1,14 @@
 from .lcd import CharLCD
 from .lcd import Alignment, CursorMode, ShiftMode
-from .contextmanagers import cursor, cleared
+from .contextmanagers import cursor, cleared, page
+from .glyphs import GlyphManager
+from .bigfont import BigFont
+from .charmaps import Charmap
+from .transitions import Slide, Wipe, Marquee, Fade
+from .manager import DisplayManager
+from .bus import SMBusTransport, I2CDevTransport, LockedTransport, FakeBus, shared_bus
+
+try:
+    from .aio import AsyncCharLCD
+except SyntaxError:  # Python 2, asyncio needs Python 3.5
+    pass
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio interface to the display, for Python 3.5 and newer.
+
+:class:`AsyncCharLCD` works like :class:`~RPLCD_i2c.CharLCD`, but the
+methods talking to the display are coroutines. The port expander bytes they
+produce are queued, and the controller's execution times are awaited with
+:func:`asyncio.sleep` instead of blocking the event loop in ``time.sleep``.
+
+Property setters (cursor position, alignment, cursor mode, ...) and
+:meth:`~RPLCD_i2c.CharLCD.command` stay plain methods: what they send is
+queued and goes out with the next coroutine call, or an explicit
+``await lcd.drain()``.
+
+Example::
+
+    >>> lcd = await AsyncCharLCD.create(0x27, cols=16, rows=2)
+    >>> await lcd.write_string('Hello')
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import asyncio
+import functools
+from collections import deque
+
+from .lcd import CharLCD, monotonic, PIN_BKLIGHT
+
+
+### HELPER FUNCTIONS ###
+
+def _draining(method):
+    """Turn a :class:`~RPLCD_i2c.CharLCD` method into a coroutine sending
+    everything it queued."""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        await self.drain()
+        return result
+    return wrapper
+
+
+### MAIN ###
+
+class AsyncCharLCD(CharLCD):
+
+    def __init__(self, *args, offload=False, **kwargs):
+        """
+        Character LCD controller driven from an asyncio event loop.
+
+        Takes the arguments of :class:`~RPLCD_i2c.CharLCD`, except for
+        ``busy_flag`` and ``threaded`` which are not supported: waits are
+        cheap here, and the event loop takes the place of the writer thread.
+
+        The constructor sleeps through the display's power-on delay, see
+        :meth:`create` to construct from a coroutine.
+
+        Args:
+            offload:
+                Where to run bus transfers. False runs them on the event loop,
+                each one blocks it for at most a few milliseconds. True runs
+                them in the loop's default executor, or pass a
+                ``concurrent.futures.Executor``. Default: False.
+
+        """
+        if kwargs.get('busy_flag') or kwargs.get('threaded'):
+            raise ValueError('AsyncCharLCD supports neither ``busy_flag`` nor ``threaded``.')
+        self._segments = deque()
+        self._offload = offload
+        self._drain_lock = None
+        super(AsyncCharLCD, self).__init__(*args, **kwargs)
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """Create a display in the default executor and wait for its
+        initialization to complete."""
+        loop = asyncio.get_event_loop()
+        lcd = await loop.run_in_executor(None, functools.partial(cls, *args, **kwargs))
+        await lcd.drain()
+        return lcd
+
+    # Coroutines
+
+    write_string = _draining(CharLCD.write_string)
+    write = _draining(CharLCD.write)
+    clear = _draining(CharLCD.clear)
+    home = _draining(CharLCD.home)
+    flush = _draining(CharLCD.flush)
+    shift_display = _draining(CharLCD.shift_display)
+    create_char = _draining(CharLCD.create_char)
+    set_backlight = _draining(CharLCD.set_backlight)
+
+    async def show_page(self, page, step_delay=0):
+        amount = self._page_shift(page)
+        CharLCD.flush(self)
+        if not step_delay:
+            CharLCD.shift_display(self, amount)
+            await self.drain()
+            return
+        step = 1 if amount > 0 else -1
+        for i in range(abs(amount)):
+            if i:
+                await asyncio.sleep(step_delay)
+            CharLCD.shift_display(self, step)
+            await self.drain()
+
+    async def close(self, clear=False):
+        if clear:
+            CharLCD.clear(self)
+        CharLCD.flush(self)
+        await self.drain()
+        self._release_bus()
+
+    async def drain(self):
+        """Send everything queued so far to the display."""
+        if self._drain_lock is None:
+            self._drain_lock = asyncio.Lock()
+        async with self._drain_lock:
+            while self._segments:
+                data, exec_time = self._segments.popleft()
+                # Same timing rule as ``CharLCD._wait_ready``
+                delay = self._ready_at - 3 * self._byte_time - monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self._offload is False:
+                    self.bus.write_bytes(self.address, data)
+                else:
+                    executor = None if self._offload is True else self._offload
+                    loop = asyncio.get_event_loop()
+                    await loop.run_in_executor(executor, self.bus.write_bytes, self.address, data)
+                self._ready_at = monotonic() + exec_time / 1e6
+
+    # Low level commands
+
+    def _transmit(self, data, exec_time):
+        """Queue port expander states for :meth:`drain`."""
+        self._segments.append((bytes(data), exec_time))
+
+    def _switch_backlight(self, value):
+        """Queue the backlight change behind the segments already queued,
+        which were encoded with the previous backlight state."""
+        if value != self.backlight_state:
+            self.backlight_state = value
+            self._load_encodings()
+        self._segments.append((bytes(bytearray([PIN_BKLIGHT if value else 0x00])), 0))
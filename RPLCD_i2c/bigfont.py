@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Big characters built from blocks of display cells.
+
+A :class:`Font` lists each character as rows of cells. A cell is either a
+character from the display ROM or a custom 5x8 glyph, which is loaded into
+CGRAM through a :class:`~RPLCD_i2c.glyphs.GlyphManager` when first used.
+Two fonts are included: ``FONT_3X2`` (3x2 cells per digit, for 16x2
+displays) and ``FONT_3X4`` (3x4 cells per digit, for 20x4 displays).
+
+Example::
+
+    >>> big = BigFont(lcd)
+    >>> big.render_big('12:34', 0, 0)
+    >>> lcd.flush()
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from collections import namedtuple
+
+from .glyphs import GlyphManager
+from .lcd import CharLCD
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+### NAMEDTUPLES ###
+
+# ``chars`` maps each character to a tuple of ``height`` strings, one per
+# row. Every symbol in them is looked up in ``cells``: a tuple value is a
+# 5x8 bitmap, an int the code of a ROM character. Symbols missing from
+# ``cells`` are written as they are. Characters not in ``chars`` are drawn
+# as blanks ``width`` cells wide.
+Font = namedtuple('Font', 'height width cells chars')
+
+
+### FONTS ###
+
+FONT_3X2 = Font(height=2, width=3, cells={
+    'T': (0b11111, 0b11111, 0b00000, 0b00000, 0b00000, 0b00000, 0b00000, 0b00000),
+    'B': (0b00000, 0b00000, 0b00000, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111),
+    '=': (0b11111, 0b11111, 0b00000, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111),
+    'r': (0b00111, 0b01111, 0b01111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111),
+    'q': (0b11100, 0b11110, 0b11110, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111),
+    'J': (0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11110, 0b11110, 0b11100),
+    'L': (0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b01111, 0b01111, 0b00111),
+    '#': 0xFF,
+}, chars={
+    '0': ('rTq', 'LBJ'),
+    '1': ('Tq ', 'B#B'),
+    '2': ('==q', '#BB'),
+    '3': ('T=q', 'BBJ'),
+    '4': ('#B#', '  J'),
+    '5': ('#==', 'BBJ'),
+    '6': ('r==', 'LBJ'),
+    '7': ('TTq', '  J'),
+    '8': ('r=q', 'LBJ'),
+    '9': ('#=q', 'BBJ'),
+    'C': ('#=', '  '),
+    '-': ('BBB', '   '),
+})
+
+FONT_3X4 = Font(height=4, width=3, cells={
+    'U': (0b11111, 0b11111, 0b11111, 0b11111, 0b00000, 0b00000, 0b00000, 0b00000),
+    'D': (0b00000, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111, 0b11111, 0b11111),
+    'o': (0b00000, 0b00000, 0b01110, 0b01110, 0b01110, 0b00000, 0b00000, 0b00000),
+    '#': 0xFF,
+}, chars={
+    '0': ('#U#', '# #', '# #', '#D#'),
+    '1': ('U# ', ' # ', ' # ', 'D#D'),
+    '2': ('UU#', 'DD#', '#  ', '#DD'),
+    '3': ('UU#', 'DD#', '  #', 'DD#'),
+    '4': ('# #', '#D#', '  #', '  #'),
+    '5': ('#UU', '#DD', '  #', 'DD#'),
+    '6': ('#UU', '#DD', '# #', '#D#'),
+    '7': ('UU#', '  #', '  #', '  #'),
+    '8': ('#U#', '#D#', '# #', '#D#'),
+    '9': ('#U#', '#D#', '  #', 'DD#'),
+    ':': (' ', 'o', 'o', ' '),
+    '-': ('   ', 'DDD', '   ', '   '),
+})
+
+
+### MAIN ###
+
+class BigFont(object):
+
+    def __init__(self, lcd, font=None, glyphs=None, spacing=1):
+        """
+        Big character renderer.
+
+        Args:
+            lcd:
+                The :class:`~RPLCD_i2c.CharLCD` instance.
+            font:
+                The :class:`Font` to draw with. Default: ``FONT_3X4`` on
+                displays with 4 rows, ``FONT_3X2`` otherwise.
+            glyphs:
+                The :class:`~RPLCD_i2c.glyphs.GlyphManager` loading custom
+                cells, share one when drawing other custom characters.
+                Default: a new one.
+            spacing:
+                Number of blank columns between characters. Default: 1.
+
+        """
+        if font is None:
+            font = FONT_3X4 if lcd.lcd.rows >= 4 else FONT_3X2
+        assert font.height <= lcd.lcd.rows, 'The font is higher than the display.'
+        self.lcd = lcd
+        self.font = font
+        self.glyphs = glyphs if glyphs is not None else GlyphManager(lcd)
+        self.spacing = spacing
+
+    def render_big(self, text, row=0, col=0):
+        """Write ``text`` in big characters with their top left corner at
+        ``(row, col)``.
+
+        Each display row of the text is written in a single
+        :meth:`~RPLCD_i2c.CharLCD.write_string` call, including the blank
+        columns between characters, and cut off at the right edge of the
+        display. The cursor is left after the last cell written.
+
+        """
+        lines = [[] for _ in range(self.font.height)]
+        gap = ' ' * self.spacing
+        for i, char in enumerate(text):
+            rows = self.font.chars.get(char) or (' ' * self.font.width,) * self.font.height
+            for line, cells in zip(lines, rows):
+                if i:
+                    line.append(gap)
+                line.extend(self._cell(symbol) for symbol in cells)
+        width = self.lcd.lcd.cols - col
+        with self.lcd._batched():
+            for i, line in enumerate(lines):
+                self.lcd.cursor_pos = (row + i, col)
+                # Plain method even on AsyncCharLCD, where it goes out with
+                # the next drain
+                CharLCD.write_string(self.lcd, ''.join(line)[:width])
+
+    def _cell(self, symbol):
+        """Return the character to write for a font symbol."""
+        cell = self.font.cells.get(symbol)
+        if cell is None:
+            return symbol
+        if isinstance(cell, int):
+            return self.lcd.charmap.char(cell)
+        return self.glyphs.char(cell)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+I²C bus transports.
+
+Every transport implements the same operations, so the LCD driver and
+the BME280 driver can run over python-smbus, a raw ``/dev/i2c-N`` device file
+or an in-memory fake without knowing which one they got.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    from smbus import SMBus
+except ImportError:  # Not on a Pi, only the other transports are usable
+    SMBus = None
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+### CONSTANTS ###
+
+# Maximum number of data bytes in a single SMBus block transfer
+I2C_BLOCK_MAX = 32
+
+# ioctl selecting the slave address of a /dev/i2c-N file descriptor
+I2C_SLAVE = 0x0703
+
+
+### NAMEDTUPLES ###
+
+Transaction = namedtuple('Transaction', 'address write read')
+
+
+### TRANSPORTS ###
+
+class Transport(object):
+    """Interface of an I²C bus transport.
+
+    Data is passed in as a sequence of ints (``bytearray``, ``bytes`` on
+    Python 3 or a list) and returned as a list of ints.
+
+    """
+
+    def write_bytes(self, address, data):
+        """Write ``data`` to the device at ``address``.
+
+        All bytes go out in as few bus transactions as the transport allows.
+        Devices without registers (like the PCF8574 port expander) receive
+        them in order.
+
+        """
+        raise NotImplementedError
+
+    def read_bytes(self, address, length):
+        """Read ``length`` bytes from a device without registers."""
+        raise NotImplementedError
+
+    def write_block(self, address, register, data):
+        """Write ``data`` to consecutive registers starting at ``register``."""
+        raise NotImplementedError
+
+    def read_block(self, address, register, length):
+        """Read ``length`` consecutive registers starting at ``register``."""
+        raise NotImplementedError
+
+    @contextmanager
+    def transaction(self):
+        """Context manager grouping operations. On a transport shared
+        between threads, no other thread's operations run in between.
+
+        Example::
+
+            >>> with bus.transaction():
+            ...     calibration = bus.read_block(0x76, 0x88, 24)
+            ...     data = bus.read_block(0x76, 0xF7, 8)
+
+        """
+        yield self
+
+    def close(self):
+        """Release the underlying bus."""
+        pass
+
+
+class SMBusTransport(Transport):
+    """Transport using the python-smbus bindings.
+
+    SMBus limits block transfers to 32 data bytes, longer writes are split
+    into several transactions.
+
+    """
+
+    def __init__(self, port):
+        if SMBus is None:
+            raise ImportError('SMBusTransport requires the python-smbus library.')
+        self.port = port
+        self._bus = SMBus(port)
+
+    def write_bytes(self, address, data):
+        # The first byte of each chunk travels in the SMBus command slot
+        for i in range(0, len(data), I2C_BLOCK_MAX + 1):
+            chunk = data[i:i + I2C_BLOCK_MAX + 1]
+            if len(chunk) == 1:
+                self._bus.write_byte(address, chunk[0])
+            else:
+                self._bus.write_i2c_block_data(address, chunk[0], list(chunk[1:]))
+
+    def read_bytes(self, address, length):
+        return [self._bus.read_byte(address) for _ in range(length)]
+
+    def write_block(self, address, register, data):
+        if len(data) == 1:
+            self._bus.write_byte_data(address, register, data[0])
+        else:
+            self._bus.write_i2c_block_data(address, register, list(data))
+
+    def read_block(self, address, register, length):
+        return self._bus.read_i2c_block_data(address, register, length)
+
+    def close(self):
+        self._bus.close()
+
+
+class I2CDevTransport(Transport):
+    """Transport writing straight to a ``/dev/i2c-N`` device file.
+
+    Writes are not limited to SMBus block sizes, so a whole frame for the
+    LCD goes out in a single transaction.
+
+    """
+
+    def __init__(self, port):
+        import fcntl
+        self._ioctl = fcntl.ioctl
+        self.port = port
+        self._fd = os.open('/dev/i2c-%d' % port, os.O_RDWR)
+        self._address = None
+
+    def _select(self, address):
+        if address != self._address:
+            self._ioctl(self._fd, I2C_SLAVE, address)
+            self._address = address
+
+    def write_bytes(self, address, data):
+        self._select(address)
+        os.write(self._fd, bytes(bytearray(data)))
+
+    def read_bytes(self, address, length):
+        self._select(address)
+        return list(bytearray(os.read(self._fd, length)))
+
+    def write_block(self, address, register, data):
+        self._select(address)
+        os.write(self._fd, bytes(bytearray([register]) + bytearray(data)))
+
+    def read_block(self, address, register, length):
+        self._select(address)
+        os.write(self._fd, bytes(bytearray([register])))
+        return list(bytearray(os.read(self._fd, length)))
+
+    def close(self):
+        os.close(self._fd)
+
+
+class LockedTransport(Transport):
+    """Wrapper making a transport safe to share between threads.
+
+    Transports select the device and transfer in separate steps, so threads
+    talking to different devices through one transport could send data to
+    the wrong one. Each operation runs under a lock here.
+
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.lock = threading.RLock()
+
+    def write_bytes(self, address, data):
+        with self.lock:
+            self.transport.write_bytes(address, data)
+
+    def read_bytes(self, address, length):
+        with self.lock:
+            return self.transport.read_bytes(address, length)
+
+    def write_block(self, address, register, data):
+        with self.lock:
+            self.transport.write_block(address, register, data)
+
+    def read_block(self, address, register, length):
+        with self.lock:
+            return self.transport.read_block(address, register, length)
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            yield self
+
+    def close(self):
+        with self.lock:
+            self.transport.close()
+
+
+class FakeBus(Transport):
+    """In-memory transport recording every transaction.
+
+    Register reads and writes are served from a 256 byte register file per
+    device address, which can be preloaded through ``registers``. Raw reads
+    return the last byte written, like the quasi-bidirectional port of a
+    PCF8574 nobody drives.
+
+    Example::
+
+        >>> bus = FakeBus()
+        >>> lcd = CharLCD(0x27, bus=bus)
+        >>> len(bus.transactions), bus.bytes_written
+
+    """
+
+    def __init__(self):
+        self.transactions = []
+        self.registers = {}
+        self._port = {}
+
+    def _registers(self, address):
+        if address not in self.registers:
+            self.registers[address] = bytearray(256)
+        return self.registers[address]
+
+    @property
+    def bytes_written(self):
+        """Total number of bytes written over all transactions."""
+        return sum(len(t.write) for t in self.transactions)
+
+    def write_bytes(self, address, data):
+        data = bytearray(data)
+        if data:
+            self._port[address] = data[-1]
+        self.transactions.append(Transaction(address, bytes(data), 0))
+
+    def read_bytes(self, address, length):
+        self.transactions.append(Transaction(address, b'', length))
+        return [self._port.get(address, 0xFF)] * length
+
+    def write_block(self, address, register, data):
+        data = bytearray(data)
+        self._registers(address)[register:register + len(data)] = data
+        self.transactions.append(Transaction(address, bytes(bytearray([register]) + data), 0))
+
+    def read_block(self, address, register, length):
+        self.transactions.append(Transaction(address, bytes(bytearray([register])), length))
+        return list(self._registers(address)[register:register + length])
+
+
+### BUS POOL ###
+
+# Transports shared by the whole process, by adapter number
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+class SharedTransport(LockedTransport):
+    """A :class:`LockedTransport` handed out by :func:`shared_bus`, closing
+    the adapter when its last user closes it."""
+
+    def __init__(self, port, transport):
+        super(SharedTransport, self).__init__(transport)
+        self.port = port
+        self.users = 0
+
+    def close(self):
+        with _pool_lock:
+            # More closes than users, or the port reopened since
+            if self.users <= 0 or _pool.get(self.port) is not self:
+                return
+            self.users -= 1
+            if self.users > 0:
+                return
+            del _pool[self.port]
+        super(SharedTransport, self).close()
+
+
+def shared_bus(port, transport=SMBusTransport):
+    """Return the transport of I²C adapter ``port`` shared by the whole
+    process.
+
+    The first call for a port opens it as ``transport(port)``, later calls
+    return the same :class:`SharedTransport`: the LCD and the sensors on an
+    adapter use a single file descriptor, and each of their operations and
+    transactions runs without the others' in between. Every call counts as
+    a user, the adapter is closed once all of them have called ``close()``.
+
+    """
+    with _pool_lock:
+        bus = _pool.get(port)
+        if bus is None:
+            bus = _pool[port] = SharedTransport(port, transport(port))
+        bus.users += 1
+        return bus
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Character ROM encodings.
+
+HD44780 controllers ship with one of two character ROMs: A00 (ASCII without
+backslash and tilde, Japanese katakana, some Greek and math symbols) or A02
+(ASCII, Western European letters, Cyrillic and Greek capitals). A
+:class:`Charmap` turns unicode strings into the codes of the ROM in a single
+``codecs.charmap_encode`` call, using a mapping built once at import time.
+
+Characters the ROM lacks can be drawn from CGRAM instead, through a
+:class:`~RPLCD_i2c.glyphs.GlyphManager`. Anything else is replaced.
+
+Example::
+
+    >>> lcd = CharLCD(0x27, charmap='A00')
+    >>> lcd.write_string('21.5°C')
+    >>> lcd.charmap = Charmap('A00', glyphs=GlyphManager(lcd))
+    >>> lcd.write_string('Café')
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from codecs import charmap_encode
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+try:
+    unichr = unichr
+except NameError:
+    unichr = chr
+
+
+### HELPER FUNCTIONS ###
+
+def _table(*parts):
+    """Merge ``{code point: ROM code}`` parts into one encoding table.
+
+    A part can also be a string, mapping its characters to consecutive codes
+    from a start code: ``(start, 'chars')``."""
+    table = {}
+    for part in parts:
+        if isinstance(part, tuple):
+            start, chars = part
+            part = dict((ord(char), start + i) for i, char in enumerate(chars))
+        table.update(part)
+    return table
+
+
+### TABLES ###
+
+# Codes 0-15 show the CGRAM characters
+_CGRAM = dict((code, code) for code in range(0x10))
+
+_ASCII = dict((code, code) for code in range(0x20, 0x7F))
+
+ROM_A00 = _table(_CGRAM, _ASCII,
+    # Yen sign and arrows in place of backslash, tilde and delete
+    {ord('\\'): None, ord('~'): None, ord('¥'): 0x5C, ord('→'): 0x7E, ord('←'): 0x7F},
+    (0xA1, ''.join(unichr(code) for code in range(0xFF61, 0xFFA0))),  # Half-width katakana
+    (0xE0, 'αäβεμσρ'), {ord('√'): 0xE8, ord('¢'): 0xEC}, (0xEE, 'ñö'),
+    (0xF2, 'θ∞Ωü'), {ord('Σ'): 0xF6, ord('π'): 0xF7}, (0xFA, '千万円÷'), {ord('█'): 0xFF},
+    # Look-alikes: the handakuten is the usual degree sign
+    {ord('°'): 0xDF, ord('·'): 0xA5, ord('µ'): 0xE4, ord('Ω'): 0xF4, ord('∑'): 0xF6},
+)
+
+ROM_A02 = _table(_CGRAM, _ASCII,
+    (0x10, '▶◀“”⏫⏬●↲↑↓→←≤≥▲▼'), {ord('⌂'): 0x7F},
+    (0x80, 'БДЖЗИЙЛПУЦЧШЩЪЫЭ'), (0x90, 'α♪ΓπΣσ♬τ'), (0x99, 'ΘΩδ∞♥ε∩'),
+    dict((code, code) for code in range(0xA1, 0x100)),  # As in ISO 8859-1
+)
+
+# Code points 0-255 sent unchanged
+ROM_RAW = dict((code, code) for code in range(0x100))
+
+ROMS = {'A00': ROM_A00, 'A02': ROM_A02, 'raw': ROM_RAW}
+
+# 5x8 bitmaps for common characters missing from the ROMs
+FALLBACK_GLYPHS = {
+    'é': (0b00010, 0b00100, 0b01110, 0b10001, 0b11111, 0b10000, 0b01110, 0b00000),
+    'è': (0b01000, 0b00100, 0b01110, 0b10001, 0b11111, 0b10000, 0b01110, 0b00000),
+    'ê': (0b00100, 0b01010, 0b01110, 0b10001, 0b11111, 0b10000, 0b01110, 0b00000),
+    'à': (0b01000, 0b00100, 0b01110, 0b00001, 0b01111, 0b10001, 0b01111, 0b00000),
+    'ç': (0b00000, 0b01110, 0b10000, 0b10000, 0b10001, 0b01110, 0b00100, 0b01100),
+    'ù': (0b01000, 0b00100, 0b10001, 0b10001, 0b10001, 0b10011, 0b01101, 0b00000),
+    'ß': (0b01110, 0b10001, 0b10001, 0b10110, 0b10001, 0b10001, 0b10110, 0b10000),
+    'Ä': (0b01010, 0b00000, 0b01110, 0b10001, 0b11111, 0b10001, 0b10001, 0b00000),
+    'Ö': (0b01010, 0b00000, 0b01110, 0b10001, 0b10001, 0b10001, 0b01110, 0b00000),
+    'Ü': (0b01010, 0b00000, 0b10001, 0b10001, 0b10001, 0b10001, 0b01110, 0b00000),
+    '€': (0b00111, 0b01000, 0b11110, 0b01000, 0b11110, 0b01000, 0b00111, 0b00000),
+    '\\': (0b00000, 0b10000, 0b01000, 0b00100, 0b00010, 0b00001, 0b00000, 0b00000),
+    '~': (0b00000, 0b00000, 0b01000, 0b10101, 0b00010, 0b00000, 0b00000, 0b00000),
+}
+
+
+### MAIN ###
+
+class Charmap(object):
+
+    def __init__(self, rom='A00', glyphs=None, fallback=FALLBACK_GLYPHS, replacement='?'):
+        """
+        Unicode to character ROM encoder.
+
+        Args:
+            rom:
+                The character ROM of the display: 'A00', 'A02', or 'raw' to
+                send code points 0-255 unchanged. Default: 'A00'.
+            glyphs:
+                The :class:`~RPLCD_i2c.glyphs.GlyphManager` loading the
+                ``fallback`` bitmaps of characters missing from the ROM.
+                Default: None, such characters are replaced.
+            fallback:
+                Dict mapping characters to 5x8 bitmaps. Default:
+                ``FALLBACK_GLYPHS``.
+            replacement:
+                Character written for anything the ROM and the fallback
+                bitmaps cannot show. Default: '?'.
+
+        """
+        if rom not in ROMS:
+            raise ValueError('Unknown character ROM {0!r}, use one of {1}.'.format(
+                rom, ', '.join(sorted(ROMS))))
+        self.rom = rom
+        self.glyphs = glyphs
+        self.fallback = fallback
+        self._table = ROMS[rom]
+        self._replacement = self._table[ord(replacement)]
+        self._chars = dict((code, unichr(point)) for point, code in
+                           sorted(self._table.items(), reverse=True) if code is not None)
+
+    def encode(self, text):
+        """Return ``text`` encoded as character codes, as a byte string."""
+        try:
+            return charmap_encode(text, 'strict', self._table)[0]
+        except UnicodeEncodeError:
+            pass
+        encoded = bytearray()
+        while text:
+            try:
+                encoded += charmap_encode(text, 'strict', self._table)[0]
+                break
+            except UnicodeEncodeError as e:
+                encoded += charmap_encode(text[:e.start], 'strict', self._table)[0]
+                encoded.extend(self._missing(char) for char in text[e.start:e.end])
+                text = text[e.end:]
+        return bytes(encoded)
+
+    def char(self, code):
+        """Return a character that encodes to the ROM character ``code``.
+
+        Raises:
+            ValueError:
+                Raised when no character maps to ``code``.
+
+        """
+        try:
+            return self._chars[code]
+        except KeyError:
+            raise ValueError('No character maps to code {0:#04x} in ROM {1}.'.format(
+                code, self.rom))
+
+    def _missing(self, char):
+        """Return the code to write for a character missing from the ROM."""
+        bitmap = self.fallback.get(char)
+        if bitmap is not None and self.glyphs is not None:
+            return self.glyphs.slot(bitmap)
+        return self._replacement
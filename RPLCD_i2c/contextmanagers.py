@@ -38,3 +38,26 @@ def cleared(lcd):
     """
     lcd.clear()
     yield
+
+
+@contextmanager
+def page(lcd, number):
+    """Context manager to draw on another page, see ``CharLCD.show_page``.
+
+    The previous page and cursor position are restored afterwards.
+
+    Example:
+
+    >>> with page(lcd, 1):
+        lcd.cursor_pos = (0, 0)
+        lcd.write_string('Coming up next')
+    >>> lcd.show_page(1)
+
+    """
+    previous, pos = lcd.page, lcd.cursor_pos
+    lcd.page = number
+    try:
+        yield
+    finally:
+        lcd.page = previous
+        lcd.cursor_pos = pos
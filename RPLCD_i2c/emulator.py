@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Software model of an HD44780 display behind a PCF8574 port expander.
+
+The emulator is a :class:`~RPLCD_i2c.bus.Transport`: hand it to
+:class:`~RPLCD_i2c.CharLCD` as ``bus`` and it decodes the port states the
+driver writes exactly like the hardware does, latching a nibble on every
+falling edge of E. It keeps DDRAM, CGRAM, the address counter, entry mode,
+display shift and backlight state, and records every instruction strobed in
+before the previous one finished executing.
+
+Reads return the busy flag and address counter while RW and E are high,
+unless the emulated board ties RW to ground.
+
+Time is the real clock plus the time the bytes would have spent on the bus,
+so sleeps in the driver count exactly like they would on a Pi.
+
+Example::
+
+    >>> emulator = HD44780Emulator(rows=2, cols=16)
+    >>> lcd = CharLCD(0x27, cols=16, rows=2, bus=emulator)
+    >>> lcd.write_string('Hello')
+    >>> emulator.lines()
+    ['Hello           ', '                ']
+    >>> emulator.violations
+    []
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from collections import namedtuple
+
+from .bus import Transport
+from .lcd import (
+        LCD_CLEARDISPLAY, LCD_RETURNHOME, LCD_ENTRYMODESET, LCD_DISPLAYCONTROL,
+        LCD_CURSORSHIFT, LCD_FUNCTIONSET, LCD_SETCGRAMADDR, LCD_SETDDRAMADDR,
+        LCD_ENTRYLEFT, LCD_ENTRYSHIFTINCREMENT, LCD_DISPLAYON, LCD_DISPLAYMOVE,
+        LCD_MOVERIGHT, LCD_2LINE, PIN_E, PIN_RW, PIN_RS, PIN_BKLIGHT,
+        EXEC_TIME, EXEC_TIME_DATA, EXEC_TIME_HOME, EXEC_TIME_INIT, BITS_PER_BYTE,
+        monotonic)
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+### CONSTANTS ###
+
+# Function set flag selecting the 8 bit interface
+LCD_8BITMODE = 0x10
+
+# Power-on delay in microseconds (HD44780U datasheet, figure 24)
+POWER_ON_TIME = 40000
+
+
+### NAMEDTUPLES ###
+
+Violation = namedtuple('Violation', 'time busy_with deficit')
+
+
+### HELPER FUNCTIONS ###
+
+def instruction_name(value, rs):
+    """Return a readable name for an instruction or data write."""
+    if rs:
+        return 'write data'
+    for flag, name in ((LCD_SETDDRAMADDR, 'set DDRAM address'),
+                       (LCD_SETCGRAMADDR, 'set CGRAM address'),
+                       (LCD_FUNCTIONSET, 'function set'),
+                       (LCD_CURSORSHIFT, 'cursor/display shift'),
+                       (LCD_DISPLAYCONTROL, 'display control'),
+                       (LCD_ENTRYMODESET, 'entry mode set'),
+                       (LCD_RETURNHOME, 'return home'),
+                       (LCD_CLEARDISPLAY, 'clear display')):
+        if value & flag:
+            return name
+    return 'no-op'
+
+
+### MAIN ###
+
+class HD44780Emulator(Transport):
+
+    def __init__(self, rows=2, cols=16, address=None, bus_speed=100000, clock=monotonic,
+            rw_grounded=False):
+        """
+        HD44780 + PCF8574 emulator.
+
+        Args:
+            rows:
+                Number of display rows, used by :meth:`lines`. Default: 2.
+            cols:
+                Number of columns per row, used by :meth:`lines`. Default: 16.
+            address:
+                Only react to writes to this address. Default: any address.
+            bus_speed:
+                I²C clock in Hz used to model transfer times. Set to 0 to
+                check timings as if bytes took no time at all. Default: 100000.
+            clock:
+                Function returning the current time in seconds.
+            rw_grounded:
+                Emulate a board with the RW line tied to ground: the display
+                never drives the data lines and every E strobe is a write.
+                Default: False.
+
+        """
+        self.rows = rows
+        self.cols = cols
+        self.address = address
+        self.byte_time = BITS_PER_BYTE / bus_speed if bus_speed else 0.0
+        self.rw_grounded = rw_grounded
+        self._clock = clock
+
+        self.port = 0xFF  # PCF8574 power-on state
+        self.ddram = bytearray(b' ' * 0x80)
+        self.cgram = bytearray(0x40)
+        self.address_counter = 0
+        self.cgram_selected = False
+        self.entry_mode = LCD_ENTRYLEFT
+        self.display_control = 0x00
+        self.function = LCD_8BITMODE
+        self.shift = 0
+        self.violations = []
+        self.instructions = 0
+
+        self._start = clock()
+        self._bus_time = 0.0
+        self._busy_until = POWER_ON_TIME / 1e6
+        self._busy_with = 'power on'
+        self._init_step = 0
+        self._nibble = None
+        self._read_low = False
+
+    # Properties
+
+    @property
+    def backlight(self):
+        """Whether the backlight pin is driven high."""
+        return bool(self.port & PIN_BKLIGHT)
+
+    @property
+    def display_enabled(self):
+        return bool(self.display_control & LCD_DISPLAYON)
+
+    @property
+    def busy(self):
+        """Whether the controller is still executing an instruction."""
+        return self.now() < self._busy_until
+
+    @property
+    def two_line(self):
+        return bool(self.function & LCD_2LINE)
+
+    def now(self):
+        """Seconds since power on, including modelled bus time."""
+        return self._clock() - self._start + self._bus_time
+
+    # Display contents
+
+    def line_address(self, row):
+        """Return the DDRAM address of the first visible cell of ``row``."""
+        if not self.two_line:
+            return row * self.cols
+        return (0x40 if row % 2 else 0x00) + (row // 2) * self.cols
+
+    def lines(self):
+        """Return the visible characters as a list of strings, one per row,
+        taking the display shift into account."""
+        width = 0x28 if self.two_line else 0x50
+        result = []
+        for row in range(self.rows):
+            start = self.line_address(row)
+            base = start & 0x40
+            chars = bytearray(self.ddram[base + (start - base + self.shift + col) % width]
+                              for col in range(self.cols))
+            result.append(chars.decode('latin-1'))
+        return result
+
+    def glyph(self, location):
+        """Return the 8 row bitmap stored in CGRAM ``location``."""
+        return tuple(self.cgram[location * 8:location * 8 + 8])
+
+    # Transport
+
+    def write_bytes(self, address, data):
+        if self.address is not None and address != self.address:
+            return
+        start = self.now()
+        # The address byte goes out before the data
+        for i, value in enumerate(bytearray(data)):
+            self._latch(value, start + (i + 2) * self.byte_time)
+        self._bus_time += (len(data) + 1) * self.byte_time
+
+    def read_bytes(self, address, length):
+        if self.address is not None and address != self.address:
+            return [0xFF] * length
+        self._bus_time += (length + 1) * self.byte_time
+        value = self.port
+        if value & PIN_RW and value & PIN_E and not self.rw_grounded:
+            # The display drives D4-D7 with the busy flag and address counter
+            status = self.address_counter | (0x80 if self.busy else 0x00)
+            nibble = status << 4 if self._read_low else status
+            value = (value & 0x0F) | (nibble & 0xF0)
+        return [value] * length
+
+    # Decoding
+
+    def _latch(self, value, now):
+        previous, self.port = self.port, value
+        if not (previous & PIN_E) or value & PIN_E:
+            # Only a falling edge of E clocks data in or out
+            return
+        if previous & PIN_RW and not self.rw_grounded:
+            # End of a read cycle, the next one returns the other nibble
+            if not self.function & LCD_8BITMODE:
+                self._read_low = not self._read_low
+            return
+        nibble = previous & 0xF0
+        rs = previous & PIN_RS
+        if self.function & LCD_8BITMODE:
+            # Upper data lines only, the lower ones read as zero
+            self._check(now)
+            self._strobe(nibble, rs, now)
+        elif self._nibble is None:
+            self._check(now)
+            self._nibble = nibble
+        else:
+            byte, self._nibble = self._nibble | nibble >> 4, None
+            self._strobe(byte, rs, now)
+
+    def _check(self, now):
+        """Record a violation if the controller is still busy."""
+        if now < self._busy_until:
+            self.violations.append(Violation(now, self._busy_with, self._busy_until - now))
+
+    def _strobe(self, value, rs, now):
+        """Execute a complete instruction or data write."""
+        self.instructions += 1
+        exec_time = EXEC_TIME_DATA if rs else self._execute(value)
+        if rs:
+            self._write_data(value)
+        self._busy_until = now + exec_time / 1e6
+        self._busy_with = instruction_name(value, rs)
+
+    def _execute(self, value):
+        """Execute an instruction and return its execution time."""
+        if value & LCD_SETDDRAMADDR:
+            self.address_counter = value & 0x7F
+            self.cgram_selected = False
+        elif value & LCD_SETCGRAMADDR:
+            self.address_counter = value & 0x3F
+            self.cgram_selected = True
+        elif value & LCD_FUNCTIONSET:
+            exec_time = EXEC_TIME
+            if self.function & LCD_8BITMODE and self._init_step < len(EXEC_TIME_INIT):
+                exec_time = EXEC_TIME_INIT[self._init_step]
+                self._init_step += 1
+            self.function = value & 0x1F
+            return exec_time
+        elif value & LCD_CURSORSHIFT:
+            step = 1 if value & LCD_MOVERIGHT else -1
+            if value & LCD_DISPLAYMOVE:
+                self._shift_display(-step)
+            else:
+                self._move(step)
+        elif value & LCD_DISPLAYCONTROL:
+            self.display_control = value & 0x07
+        elif value & LCD_ENTRYMODESET:
+            self.entry_mode = value & 0x03
+        elif value & LCD_RETURNHOME:
+            self.address_counter = 0
+            self.cgram_selected = False
+            self.shift = 0
+            return EXEC_TIME_HOME
+        elif value & LCD_CLEARDISPLAY:
+            self.ddram[:] = b' ' * len(self.ddram)
+            self.address_counter = 0
+            self.cgram_selected = False
+            self.entry_mode |= LCD_ENTRYLEFT
+            self.shift = 0
+            return EXEC_TIME_HOME
+        return EXEC_TIME
+
+    def _write_data(self, value):
+        if self.cgram_selected:
+            self.cgram[self.address_counter] = value
+        else:
+            self.ddram[self.address_counter] = value
+        step = 1 if self.entry_mode & LCD_ENTRYLEFT else -1
+        self._move(step)
+        if self.entry_mode & LCD_ENTRYSHIFTINCREMENT:
+            self._shift_display(step)
+
+    def _move(self, step):
+        """Move the address counter, wrapping like the controller does."""
+        if self.cgram_selected:
+            self.address_counter = (self.address_counter + step) % 0x40
+        elif not self.two_line:
+            self.address_counter = (self.address_counter + step) % 0x50
+        else:
+            line = self.address_counter & 0x40
+            col = (self.address_counter & 0x3F) + step
+            if col > 0x27:
+                line, col = line ^ 0x40, 0
+            elif col < 0:
+                line, col = line ^ 0x40, 0x27
+            self.address_counter = line | col
+
+    def _shift_display(self, step):
+        """Shift the display contents left (positive) or right (negative)."""
+        self.shift = (self.shift + step) % (0x28 if self.two_line else 0x50)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+CGRAM glyph management.
+
+The HD44780 has room for eight custom characters. A :class:`GlyphManager`
+hands out slots by bitmap: asking for a bitmap that is already loaded
+returns its slot without touching the display, anything else is uploaded to
+a free slot, or to the least recently used one not shown on the display.
+
+Example::
+
+    >>> glyphs = GlyphManager(lcd)
+    >>> lcd.write_string(glyphs.char(smiley) + ' hello')
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from .lcd import CharLCD
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+try:
+    unichr = unichr
+except NameError:
+    unichr = chr
+
+
+### CONSTANTS ###
+
+# Number of CGRAM slots for 5x8 characters. Character codes 8-15 show the
+# same glyphs as 0-7.
+CGRAM_SLOTS = 8
+
+
+### MAIN ###
+
+class GlyphManager(object):
+
+    def __init__(self, lcd, slots=CGRAM_SLOTS):
+        """
+        CGRAM slot allocator.
+
+        Args:
+            lcd:
+                The :class:`~RPLCD_i2c.CharLCD` instance.
+            slots:
+                Number of slots to manage, starting at 0. Lower it to keep the
+                last slots for characters created by hand. Default: 8.
+
+        """
+        assert 1 <= slots <= CGRAM_SLOTS, 'Only 1 to 8 slots can be managed.'
+        self.lcd = lcd
+        self.uploads = 0
+        self._bitmaps = [None] * slots
+        self._slots = {}
+        self._last_used = [0] * slots
+        self._clock = 0
+
+    def slot(self, bitmap):
+        """Return the CGRAM location holding ``bitmap``, uploading it if
+        needed.
+
+        Args:
+            bitmap:
+                8 numbers, each representing a 5 pixel row.
+
+        Raises:
+            ValueError:
+                Raised when the bitmap is not loaded yet and every slot holds
+                a glyph that is on the display.
+
+        """
+        assert len(bitmap) == 8, 'Bitmap should have exactly 8 rows.'
+        key = tuple(row & 0x1F for row in bitmap)
+        self._clock += 1
+        location = self._slots.get(key)
+        if location is None:
+            location = self._evict()
+            self._slots[key] = location
+            self._bitmaps[location] = key
+            # Plain method even on AsyncCharLCD, where it goes out with the
+            # next drain
+            CharLCD.create_char(self.lcd, location, key)
+            self.uploads += 1
+        self._last_used[location] = self._clock
+        return location
+
+    def char(self, bitmap):
+        """Return a one character string showing ``bitmap``, see :meth:`slot`."""
+        return unichr(self.slot(bitmap))
+
+    def _evict(self):
+        """Free the least recently used slot not on the display and return it."""
+        candidates = [location for location in range(len(self._bitmaps))
+                      if not self._on_display(location)]
+        if not candidates:
+            raise ValueError('All CGRAM slots hold glyphs that are on the display.')
+        location = min(candidates, key=lambda location: (
+            self._bitmaps[location] is not None, self._last_used[location]))
+        if self._bitmaps[location] is not None:
+            del self._slots[self._bitmaps[location]]
+        return location
+
+    def _on_display(self, location):
+        """Whether the glyph in ``location`` is in display data RAM, or will
+        be after the next flush.
+
+        The whole DDRAM is checked, cells outside the visible window come
+        into view when the display is shifted."""
+        if self._bitmaps[location] is None:
+            return False
+        lcd = self.lcd
+        for ddram in (lcd._content, lcd._frame) if lcd._framebuffer else (lcd._content,):
+            if location in ddram or location + CGRAM_SLOTS in ddram:
+                return True
+        return False
@@ -22,12 +22,16 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from __future__ import print_function, division, absolute_import, unicode_literals
 
+import re
+import threading
 import time
 from collections import namedtuple
-
-from smbus import SMBus
+from contextlib import contextmanager
 
 from . import enum
+from .bus import shared_bus
+from .charmaps import Charmap
+from .writer import Writer
 
 ### PYTHON 3 COMPAT ###
 
@@ -36,6 +40,11 @@ try:
 except NameError:
     pass
 
+try:
+    monotonic = time.monotonic
+except AttributeError:  # Python 2
+    monotonic = time.time
+
 
 ### BIT PATTERNS ###
 
@@ -89,6 +98,39 @@ PIN_RW = 0x2
 PIN_RS = 0x1
 PIN_BKLIGHT = 0x8
 
+# Instruction execution times in microseconds (HD44780U datasheet,
+# fosc = 270kHz). Data writes include the address counter update (tADD).
+EXEC_TIME = 37
+EXEC_TIME_DATA = 41
+EXEC_TIME_HOME = 1520
+
+# Waits after the first two function sets of the initialization sequence
+EXEC_TIME_INIT = (4100, 100)
+
+# Bits per byte on the I²C wire: eight data bits plus ACK
+BITS_PER_BYTE = 9
+
+# How long to keep polling the busy flag past the datasheet execution time
+# before giving up, in microseconds
+BUSY_TIMEOUT = 10000
+
+# Size of the display data RAM address space, and its contents after a clear
+DDRAM_SIZE = 0x80
+DDRAM_BLANK = b' ' * DDRAM_SIZE
+
+# Length of a DDRAM line in two line and one line mode. The display shift
+# scrolls the visible window around it.
+LINE_WIDTH_2LINE = 0x28
+LINE_WIDTH_1LINE = 0x50
+
+# Framebuffer flush cost model, in bytes sent to the display: moving the
+# address counter takes one instruction, so gaps of unchanged cells up to
+# this width are cheaper to rewrite than to jump over.
+JUMP_COST = 1
+
+# Characters moving the cursor in ``write_string``
+SPECIAL_CHARS = re.compile(b'([\n\r])')
+
 ### NAMEDTUPLES ###
 
 LCDConfig = namedtuple('LCDConfig', 'rows cols dotsize')
@@ -113,6 +155,49 @@ class CursorMode(enum.Enum):
 
 ### HELPER FUNCTIONS ###
 
+_encodings = {}
+
+
+def encoding(mode, backlight):
+    """Return the port expander encoding of every byte value for the given
+    RS mode and backlight state.
+
+    Each byte goes out as four port states: E high and E low for the upper
+    nibble, then for the lower one. The result is a ``(codes, lanes)`` tuple:
+    ``codes[value]`` holds the four states of ``value``, and ``lanes`` are
+    four ``bytes.translate`` tables yielding the 1st, 2nd, 3rd and 4th state
+    of every byte in a string at once. Tables are built once and cached.
+
+    """
+    key = (mode, bool(backlight))
+    if key not in _encodings:
+        bl = PIN_BKLIGHT if backlight else 0x00
+        codes = []
+        for value in range(256):
+            high = mode | bl | (value & 0xF0)
+            low = mode | bl | ((value << 4) & 0xF0)
+            codes.append(bytearray((high | PIN_E, high, low | PIN_E, low)))
+        lanes = tuple(bytes(bytearray(code[i] for code in codes)) for i in range(4))
+        _encodings[key] = (tuple(bytes(code) for code in codes), lanes)
+    return _encodings[key]
+
+
+def _diff(old, new, gap):
+    """Return the ``(start, stop)`` index ranges where two equally long byte
+    strings differ. Ranges at most ``gap`` bytes apart are merged."""
+    if old == new:
+        return []
+    runs = []
+    for i in range(len(new)):
+        if old[i] == new[i]:
+            continue
+        if runs and i - runs[-1][1] <= gap:
+            runs[-1][1] = i + 1
+        else:
+            runs.append([i, i + 1])
+    return runs
+
+
 def msleep(milliseconds):
     """Sleep the specified amount of milliseconds."""
     time.sleep(milliseconds / 1000.0)
@@ -129,7 +214,8 @@ class CharLCD(object):
 
     # Init, setup, teardown
     def __init__(self, address, port = 1, cols=20, rows=4, dotsize=8, 
-            ignore_special=False, backlight_state=True):
+            ignore_special=False, backlight_state=True, framebuffer=False,
+            bus=None, bus_speed=100000, busy_flag=False, threaded=False, charmap='raw'):
         """
         Character LCD controller.
 
@@ -156,6 +242,41 @@ class CharLCD(object):
                 Backlight will be enabled on power-up (before library init)
                 due to port expander default value 0xFF.
                 Default: True (backlight is on).
+            framebuffer:
+                Whether to draw into an off-screen framebuffer. Writes,
+                cursor moves and ``clear`` then only update memory and
+                :meth:`flush` sends the minimal set of changes to the display.
+                Default: False.
+            bus:
+                The :class:`~RPLCD_i2c.bus.Transport` to talk through.
+                Default: the transport of ``port`` shared by the whole
+                process, see :func:`~RPLCD_i2c.bus.shared_bus`.
+            bus_speed:
+                I²C clock in Hz. Time spent on the wire counts towards the
+                controller's execution times, so this must not be lower
+                than the actual bus clock. Default: 100000 (the PCF8574
+                maximum).
+            busy_flag:
+                Whether to read the busy flag through the port expander
+                instead of sleeping for slow instructions. Requires the RW
+                line to be wired to P1, the driver falls back to timed delays
+                when it reads back as tied to ground. Default: False.
+            threaded:
+                Whether to talk to the display from a background thread.
+                Implies ``framebuffer``: drawing only updates memory, and
+                :meth:`flush` as well as commands are queued and return
+                immediately. Flushes requested while one is still waiting
+                are merged into it. Call :meth:`close` to let the queue
+                drain before exiting. Pass a :class:`~RPLCD_i2c.writer.Writer`
+                instead of True to share its thread with other displays on
+                the same bus, see :class:`~RPLCD_i2c.manager.DisplayManager`.
+                Default: False.
+            charmap:
+                Character ROM of the display, used to encode strings: 'A00'
+                (Japanese), 'A02' (European), 'raw' to send code points
+                0-255 unchanged, or a :class:`~RPLCD_i2c.charmaps.Charmap`.
+                Can be changed later through the ``charmap`` attribute.
+                Default: 'raw'.
 
         Returns:
             A :class:`CharLCD` instance.
@@ -169,7 +290,9 @@ class CharLCD(object):
         self.address = address
         self.port = port
 
-        self.bus = SMBus(self.port)
+        # A bus taken from the pool is released by close()
+        self._pooled_bus = bus is None
+        self.bus = bus if bus is not None else shared_bus(self.port)
         msleep(50)
 
         # Setup initial display configuration
@@ -183,53 +306,123 @@ class CharLCD(object):
             # For some 1 line displays you can select a 10px font.
             displayfunction |= LCD_5x10DOTS
 
-        # Create content cache
-        self._content = [[0x20] * cols for _ in range(rows)]
-
-        # Set up ignore special characters
+        # Set up pages: on one and two row displays, each DDRAM line holds
+        # several screens side by side. Four row displays use the lines
+        # for their third and fourth row instead.
+        self._line_width = LINE_WIDTH_1LINE if rows == 1 else LINE_WIDTH_2LINE
+        if rows <= 2:
+            self.pages = self._line_width // cols
+            self._page_offsets = [tuple(offset + page * cols for offset in (0x00, 0x40)[:rows])
+                                  for page in range(self.pages)]
+        else:
+            self.pages = 1
+            self._page_offsets = [(0x00, 0x40, cols, 0x40 + cols)[:rows]]
+        self._ddram_rows = sorted(sum(self._page_offsets, ()))
+
+        # ``_row_offsets`` are the addresses of the rows of the page drawn
+        # to, ``_shift`` how many cells the display is shifted left by
+        self._page = 0
+        self._row_offsets = self._page_offsets[0]
+        self._shift = 0
+
+        # Create content cache: an image of the display data RAM indexed by
+        # address, including the cells that are not visible, with a
+        # memoryview on each row of every page
+        self._content = bytearray(DDRAM_BLANK)
+        self._content_rows = self._row_views(self._content)
+
+        # Set up framebuffer, laid out like the content cache. ``_hw_address``
+        # is the display's address counter, or None when unknown.
+        self._framebuffer = framebuffer or threaded
+        self._frame = bytearray(DDRAM_BLANK)
+        self._frame_rows = self._row_views(self._frame)
+        self._hw_address = None
+
+        # The writer thread, if any, is started once the display is set up.
+        # ``_lock`` guards the framebuffer and cursor position against it
+        # reading them mid-update.
+        self._writer = None
+        self._shared_writer = False
+        self._lock = threading.RLock()
+
+        # Set up ignore special characters and the string encoding
         self.ignore_special = ignore_special
+        self.charmap = charmap if isinstance(charmap, Charmap) else Charmap(charmap)
 
-        # Set up backlight state
+        # Set up backlight state and the matching encoding tables
         self.backlight_state = backlight_state
-        
+        self._load_encodings()
+
+        # Pending port expander bytes while batching, see ``_batched``, and
+        # execution time in µs of the last instruction among them
+        self._tx = None
+        self._tx_exec = 0
+
+        # Set up timing. ``_ready_at`` is when the controller will have
+        # finished executing the last instruction sent. Instructions queued
+        # back to back are two bytes apart on the wire.
+        self._byte_time = BITS_PER_BYTE / bus_speed
+        self._tx_gap = 2 * self._byte_time * 1e6
+        self._ready_at = 0
+        self._busy_flag = False
+
         # Initialization
         msleep(50)
 
         # Hitachi manual page 46
         # 4 bit mode
 
-        self._write4bits(0x03 << 4)
-        msleep(4.5)
-        self._write4bits(0x03 << 4)
-        msleep(4.5)
-        self._write4bits(0x03 << 4)
-        usleep(100)
-        self._write4bits(0x02 << 4)
+        self._write4bits(0x03 << 4, EXEC_TIME_INIT[0])
+        self._write4bits(0x03 << 4, EXEC_TIME_INIT[1])
+        self._write4bits(0x03 << 4, EXEC_TIME)
+        self._write4bits(0x02 << 4, EXEC_TIME)
 
         # Write configuration to display
         self.command(LCD_FUNCTIONSET | displayfunction)
-        usleep(50)
 
         # Configure display mode
         self._display_mode = LCD_DISPLAYON
         self._cursor_mode = int(CursorMode.hide)
         self.command(LCD_DISPLAYCONTROL | self._display_mode | self._cursor_mode)
-        usleep(50)
 
         # Clear display
-        self.clear()
+        self.command(LCD_CLEARDISPLAY)
+        self._hw_address = 0
 
         # Configure entry mode
         self._text_align_mode = int(Alignment.left)
         self._display_shift_mode = int(ShiftMode.cursor)
         self._cursor_pos = (0, 0)
         self.command(LCD_ENTRYMODESET | self._text_align_mode | self._display_shift_mode)
-        usleep(50)
+
+        # Check whether the busy flag can be read
+        self._busy_flag = busy_flag and self._probe_busy_flag()
+
+        # Hand the display over to the writer thread
+        if isinstance(threaded, Writer):
+            self._writer = threaded
+            self._shared_writer = True
+        elif threaded:
+            self._writer = Writer()
 
     def close(self, clear=False):
         if clear:
             self.clear()
+        self.flush()
+        if self._writer is not None:
+            # Drain the queue, the display is driven synchronously afterwards
+            writer, self._writer = self._writer, None
+            if self._shared_writer:
+                writer.wait()
+            else:
+                writer.close()
+        self._release_bus()
 
+    def _release_bus(self):
+        """Hand the shared bus back to the pool, once."""
+        if self._pooled_bus:
+            self._pooled_bus = False
+            self.bus.close()
 
     # Properties
 
@@ -242,14 +435,37 @@ class CharLCD(object):
         if value[0] not in range(self.lcd.rows) or value[1] not in range(self.lcd.cols):
             msg = 'Cursor position {pos!r} invalid on a {lcd.rows}x{lcd.cols} LCD.'
             raise ValueError(msg.format(pos=value, lcd=self.lcd))
-        row_offsets = [0x00, 0x40, self.lcd.cols, 0x40 + self.lcd.cols]
         self._cursor_pos = value
-        self.command(LCD_SETDDRAMADDR | row_offsets[value[0]] + value[1])
-        usleep(50)
+        if self._framebuffer:
+            return
+        self._set_address(self._row_offsets[value[0]] + value[1])
 
     cursor_pos = property(_get_cursor_pos, _set_cursor_pos,
             doc='The cursor position as a 2-tuple (row, col).')
 
+    def _get_page(self):
+        return self._page
+
+    def _set_page(self, value):
+        if value not in range(self.pages):
+            msg = 'Page {page!r} invalid, the display has {pages} page(s).'
+            raise ValueError(msg.format(page=value, pages=self.pages))
+        with self._lock:
+            self._page = value
+            self._row_offsets = self._page_offsets[value]
+            # Same cursor position, on the new page
+            self.cursor_pos = self._cursor_pos
+
+    page = property(_get_page, _set_page,
+            doc='The page writes and cursor positions refer to, see :meth:`show_page`.')
+
+    def _get_visible_page(self):
+        page, rest = divmod(self._shift, self.lcd.cols)
+        return page if not rest and page < self.pages else None
+
+    visible_page = property(_get_visible_page,
+            doc='The page in view, or None while the display is shifted in between.')
+
     def _get_text_align_mode(self):
         try:
             return Alignment[self._text_align_mode]
@@ -261,7 +477,6 @@ class CharLCD(object):
             raise ValueError('Cursor move mode must be of ``Alignment`` type.')
         self._text_align_mode = int(value)
         self.command(LCD_ENTRYMODESET | self._text_align_mode | self._display_shift_mode)
-        usleep(50)
 
     text_align_mode = property(_get_text_align_mode, _set_text_align_mode,
             doc='The text alignment (``Alignment.left`` or ``Alignment.right``).')
@@ -277,7 +492,6 @@ class CharLCD(object):
             raise ValueError('Write shift mode must be of ``ShiftMode`` type.')
         self._display_shift_mode = int(value)
         self.command(LCD_ENTRYMODESET | self._text_align_mode | self._display_shift_mode)
-        usleep(50)
 
     write_shift_mode = property(_get_write_shift_mode, _set_write_shift_mode,
             doc='The shift mode when writing (``ShiftMode.cursor`` or ``ShiftMode.display``).')
@@ -288,7 +502,6 @@ class CharLCD(object):
     def _set_display_enabled(self, value):
         self._display_mode = LCD_DISPLAYON if value else LCD_DISPLAYOFF
         self.command(LCD_DISPLAYCONTROL | self._display_mode | self._cursor_mode)
-        usleep(50)
 
     display_enabled = property(_get_display_enabled, _set_display_enabled,
             doc='Whether or not to display any characters.')
@@ -304,7 +517,6 @@ class CharLCD(object):
             raise ValueError('Cursor mode must be of ``CursorMode`` type.')
         self._cursor_mode = int(value)
         self.command(LCD_DISPLAYCONTROL | self._display_mode | self._cursor_mode)
-        usleep(50)
 
     cursor_mode = property(_get_cursor_mode, _set_cursor_mode,
             doc='How the cursor should behave (``CursorMode.hide``, ' +
@@ -332,50 +544,167 @@ class CharLCD(object):
             >>> bstring.decode('utf-8')
             u'Temperature: 30\xb0C'
 
-        Only characters with an ``ord()`` value between 0 and 255 are currently
-        supported.
+        Characters are encoded with the ``charmap``. Characters it cannot
+        map are replaced, by default with a question mark.
+
+        The string is cut into runs at special characters and row ends, and
+        each run is written in one go. Cells already showing the right
+        character are skipped.
 
         """
-        for char in value:
-            # Write regular chars
-            if self.ignore_special or char not in '\n\r':
-                self.write(ord(char))
-                continue
-            # Handle newlines and carriage returns
-            row, col = self.cursor_pos
-            if char == '\n':
-                if row < self.lcd.rows - 1:
-                    self.cursor_pos = (row + 1, col)
-                else:
-                    self.cursor_pos = (0, col)
-            elif char == '\r':
-                if self.text_align_mode is Alignment.left:
-                    self.cursor_pos = (row, 0)
-                else:
-                    self.cursor_pos = (row, self.lcd.cols - 1)
+        cols, rows = self.lcd.cols, self.lcd.rows
+        left = self._text_align_mode == LCD_ENTRYLEFT
+        row, col = self._cursor_pos
+        data = self.charmap.encode(value)
+        chunks = [data] if self.ignore_special else SPECIAL_CHARS.split(data)
+        with self._lock, self._batched():
+            for chunk in chunks:
+                # Handle newlines and carriage returns
+                if chunk == b'\n':
+                    row = row + 1 if row < rows - 1 else 0
+                    continue
+                if chunk == b'\r':
+                    col = 0 if left else cols - 1
+                    continue
+                # Write regular chars, one run per row they span
+                while chunk:
+                    offset = self._row_offsets[row]
+                    if left:
+                        count = min(len(chunk), cols - col)
+                        self._write_cells(offset + col, chunk[:count])
+                        col += count
+                    else:
+                        count = min(len(chunk), col + 1)
+                        col -= count
+                        self._write_cells(offset + col + 1, chunk[count - 1::-1], reverse=True)
+                    chunk = chunk[count:]
+                    if not 0 <= col < cols:
+                        # Wrap to the start of the next row
+                        row = row + 1 if row < rows - 1 else 0
+                        col = 0 if left else cols - 1
+            self._cursor_pos = (row, col)
+            address = self._row_offsets[row] + col
+            if not self._framebuffer and self._hw_address != address:
+                self._set_address(address)
 
     def clear(self):
-        """Overwrite display with blank characters and reset cursor position."""
-        self.command(LCD_CLEARDISPLAY)
+        """Overwrite display with blank characters and reset cursor position.
+
+        Every page is blanked. The display shift is reset as well, bringing
+        page 0 into view, except in framebuffer mode: there only the
+        framebuffer is blanked, the display is updated on the next
+        :meth:`flush`."""
+        if self._framebuffer:
+            with self._lock:
+                self._frame[:] = DDRAM_BLANK
+                self._cursor_pos = (0, 0)
+            return
         self._cursor_pos = (0, 0)
-        self._content = [[0x20] * self.lcd.cols for _ in range(self.lcd.rows)]
-        msleep(2)
+        self.command(LCD_CLEARDISPLAY)
+        self._hw_address = 0
+        self._shift = 0
+        self._content[:] = DDRAM_BLANK
 
     def home(self):
         """Set cursor to initial position and reset any shifting."""
-        self.command(LCD_RETURNHOME)
         self._cursor_pos = (0, 0)
-        msleep(2)
+        self._shift = 0
+        self._call(self._return_home)
+
+    def flush(self):
+        """Bring the display up to date with the framebuffer.
+
+        Only changed cells are sent. Between two changed cells on the same
+        row, the unchanged ones are rewritten when that is cheaper than moving
+        the address counter (see ``JUMP_COST``). Does nothing when not in
+        framebuffer mode."""
+        if not self._framebuffer:
+            return
+        if self._writer is not None and not self._writer.is_current():
+            self._writer.submit(self._flush, key=(self, 'flush'))
+            return
+        self._flush()
+
+    def _flush(self):
+        """Send the changes in the framebuffer to the display."""
+        if self._writer is None:
+            frame, frame_rows, cursor = self._frame, self._frame_rows, self._cursor_pos
+            offsets = self._row_offsets
+        else:
+            # Work on a snapshot, producers keep drawing meanwhile
+            with self._lock:
+                frame, cursor = bytearray(self._frame), self._cursor_pos
+                offsets = self._row_offsets
+            frame_rows = self._row_views(frame)
+        entrymode = LCD_ENTRYLEFT | LCD_ENTRYSHIFTDECREMENT
+        restore = self._text_align_mode | self._display_shift_mode
+        # Runs are written left to right without shifting the display, the
+        # entry mode is switched before the first one only
+        switch = restore != entrymode
+        with self._batched():
+            for offset, frame_row, content_row in zip(
+                    self._ddram_rows, frame_rows, self._content_rows):
+                if frame_row == content_row:
+                    continue
+                for start, stop in self._plan_row(frame, offset):
+                    if switch:
+                        self.command(LCD_ENTRYMODESET | entrymode)
+                        switch = False
+                    if self._hw_address != start:
+                        self._set_address(start)
+                    run = frame[start:stop]
+                    self._send_data(run)
+                    self._content[start:stop] = run
+                    self._hw_address = stop
+            if restore != entrymode and not switch:
+                self.command(LCD_ENTRYMODESET | restore)
+            row, col = cursor
+            cursor = offsets[row] + col
+            if self._cursor_mode != LCD_CURSOROFF | LCD_BLINKOFF and self._hw_address != cursor:
+                # Leave the visible cursor where the framebuffer's one is
+                self._set_address(cursor)
 
     def shift_display(self, amount):
         """Shift the display. Use negative amounts to shift left and positive
         amounts to shift right."""
         if amount == 0:
             return
+        self._shift = (self._shift - amount) % self._line_width
         direction = LCD_MOVERIGHT if amount > 0 else LCD_MOVELEFT
+        with self._batched():
+            for i in range(abs(amount)):
+                self.command(LCD_CURSORSHIFT | LCD_DISPLAYMOVE | direction)
+
+    def show_page(self, page, step_delay=0):
+        """Bring a page into view by shifting the display.
+
+        Draw the next screen on a page that is not visible (see
+        :attr:`page`), then call this to slide it in: the display shifts
+        the shortest way round, one column per ``step_delay`` seconds, or
+        all at once when it is 0. See :mod:`RPLCD_i2c.transitions` for more
+        animations. Nothing but shift instructions is sent,
+        apart from flushing the framebuffer first.
+
+        Example::
+
+            >>> lcd.page = 1
+            >>> lcd.write_string('Next screen')
+            >>> lcd.show_page(1, step_delay=0.05)
+
+        """
+        amount = self._page_shift(page)
+        self.flush()
+        if not step_delay:
+            self.shift_display(amount)
+            return
+        # Steps are timed from the start, time spent sending does not add up
+        step = 1 if amount > 0 else -1
+        start = monotonic()
         for i in range(abs(amount)):
-            self.command(LCD_CURSORSHIFT | LCD_DISPLAYMOVE | direction)
-            usleep(50)
+            delay = start + i * step_delay - monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.shift_display(step)
 
     def create_char(self, location, bitmap):
         """Create a new character.
@@ -412,46 +741,43 @@ class CharLCD(object):
         """
         assert 0 <= location <= 7, 'Only locations 0-7 are valid.'
         assert len(bitmap) == 8, 'Bitmap should have exactly 8 rows.'
-
-        # Store previous position
-        pos = self.cursor_pos
-
-        # Write character to CGRAM
-        self.command(LCD_SETCGRAMADDR | location << 3)
-        for row in bitmap:
-            self._send(row, RS_DATA)
-
-        # Restore cursor pos
-        self.cursor_pos = pos
+        self._call(self._write_cgram, location, tuple(bitmap))
 
     def set_backlight(self, value):
         """Set backlight state (if connected) """
         assert isinstance(value, bool), 'Backlight state can only be True or False'
-        self.backlight_state = value
-        self.bus.write_byte(self.address, PIN_BKLIGHT if self.backlight_state else 0x00)
-        
+        self._call(self._switch_backlight, value)
+
     # Mid level commands
 
     def command(self, value):
         """Send a raw command to the LCD."""
-        self._send(value, RS_INSTRUCTION)
+        self._call(self._send, value, RS_INSTRUCTION)
 
     def write(self, value):
         """Write a raw byte to the LCD."""
 
         # Get current position
         row, col = self._cursor_pos
+        address = self._row_offsets[row] + col
 
         # Write byte if changed
-        if self._content[row][col] != value:
+        if self._framebuffer:
+            self._frame[address] = value
+            unchanged = False
+        elif self._content[address] != value:
             self._send(value, RS_DATA)
-            self._content[row][col] = value  # Update content cache
+            self._content[address] = value  # Update content cache
+            step = 1 if self._text_align_mode == LCD_ENTRYLEFT else -1
+            self._hw_address = address + step
+            if self._display_shift_mode == LCD_ENTRYSHIFTINCREMENT:
+                self._shift = (self._shift + step) % self._line_width
             unchanged = False
         else:
             unchanged = True
 
         # Update cursor position.
-        if self.text_align_mode is Alignment.left:
+        if self._text_align_mode == LCD_ENTRYLEFT:
             if col < self.lcd.cols - 1:
                 # No newline, update internal pointer
                 newpos = (row, col + 1)
@@ -483,19 +809,232 @@ class CharLCD(object):
 
     # Low level commands
 
+    def _call(self, function, *args):
+        """Run ``function(*args)`` on the writer thread, or right away when
+        there is none or when already on it."""
+        if self._writer is None or self._writer.is_current():
+            function(*args)
+        else:
+            self._writer.submit(function, args)
+
+    def _return_home(self):
+        self.command(LCD_RETURNHOME)
+        self._hw_address = 0
+
+    def _write_cgram(self, location, bitmap):
+        with self._batched():
+            # Write character to CGRAM
+            self.command(LCD_SETCGRAMADDR | location << 3)
+            for row in bitmap:
+                self._send(row, RS_DATA)
+
+            # Restore cursor pos. In framebuffer mode the next flush does.
+            self._hw_address = None
+            if not self._framebuffer:
+                row, col = self._cursor_pos
+                self._set_address(self._row_offsets[row] + col)
+
+    def _switch_backlight(self, value):
+        if value != self.backlight_state:
+            self.backlight_state = value
+            self._load_encodings()
+        self.bus.write_bytes(self.address, [PIN_BKLIGHT if self.backlight_state else 0x00])
+
+    def _page_shift(self, page):
+        """Return the ``shift_display`` amount bringing ``page`` into view."""
+        if page not in range(self.pages):
+            msg = 'Page {page!r} invalid, the display has {pages} page(s).'
+            raise ValueError(msg.format(page=page, pages=self.pages))
+        left = (page * self.lcd.cols - self._shift) % self._line_width
+        right = self._line_width - left
+        return -left if left <= right else right
+
+    def _row_views(self, ddram):
+        """Return a memoryview on each row of every page of a DDRAM image."""
+        view = memoryview(ddram)
+        return [view[offset:offset + self.lcd.cols] for offset in self._ddram_rows]
+
+    def _plan_row(self, frame, offset):
+        """Return the runs of cells to send for the row of ``frame`` starting
+        at address ``offset``, as ``(start, stop)`` DDRAM address ranges.
+
+        Runs separated by at most ``JUMP_COST`` unchanged cells are merged,
+        and the first run is extended back to the address counter if it is
+        that close to it."""
+        stop = offset + self.lcd.cols
+        runs = [[offset + start, offset + end] for start, end in
+                _diff(self._content[offset:stop], frame[offset:stop], JUMP_COST)]
+        pos = self._hw_address
+        if runs and pos is not None and pos >= offset and 0 <= runs[0][0] - pos <= JUMP_COST:
+            runs[0][0] = pos
+        return runs
+
+    def _write_cells(self, address, cells, reverse=False):
+        """Write ``cells`` to consecutive DDRAM addresses from ``address`` on.
+
+        Only the cells that changed are sent, in increasing address order, or
+        decreasing order with ``reverse`` when the display is in right to left
+        entry mode."""
+        cells = bytearray(cells)
+        stop = address + len(cells)
+        if self._framebuffer:
+            self._frame[address:stop] = cells
+            return
+        # Rewriting unchanged cells would shift the display in shift mode
+        shifting = self._display_shift_mode == LCD_ENTRYSHIFTINCREMENT
+        gap = 0 if shifting else JUMP_COST
+        runs = _diff(self._content[address:stop], cells, gap)
+        if reverse:
+            runs.reverse()
+        for start, end in runs:
+            run = cells[start:end]
+            first = address + (end - 1 if reverse else start)
+            if self._hw_address != first:
+                self._set_address(first)
+            self._send_data(run[::-1] if reverse else run)
+            self._content[address + start:address + end] = run
+            self._hw_address = address + (start - 1 if reverse else end)
+            if shifting:
+                step = start - end if reverse else end - start
+                self._shift = (self._shift + step) % self._line_width
+
+    def _set_address(self, address):
+        """Point the display's address counter at a DDRAM address."""
+        self.command(LCD_SETDDRAMADDR | address)
+        self._hw_address = address
+
+    @contextmanager
+    def _batched(self):
+        """Collect everything sent inside the block and push it to the port
+        expander in as few bus transactions as possible.
+
+        No delays are inserted between queued instructions as long as the
+        bus time between them covers their execution time. The batch is cut
+        after slower ones (clear, home) to wait for the controller."""
+        if self._tx is not None or (self._writer is not None and not self._writer.is_current()):
+            # Nested batch, the outermost one transmits. Threads drawing
+            # for the writer thread send nothing, and must not capture what
+            # it sends meanwhile.
+            yield
+            return
+        # Other threads sharing the bus wait for the whole batch
+        with self.bus.transaction():
+            self._tx = bytearray()
+            try:
+                yield
+            finally:
+                data, self._tx = self._tx, None
+                if data:
+                    self._transmit(data, self._tx_exec)
+
     def _send(self, value, mode):
         """Send the specified value to the display.
         The rs_mode is either ``RS_DATA`` or ``RS_INSTRUCTION``."""
-        self._write4bits(mode | (value & 0xF0))
-        self._write4bits(mode | ((value << 4) & 0xF0))
-
-    def _write4bits(self, value):
-        """Write 4 bits of data into the data bus."""
+        if mode == RS_DATA:
+            exec_time = EXEC_TIME_DATA
+        elif value < LCD_ENTRYMODESET:
+            # Clear display and return home
+            exec_time = EXEC_TIME_HOME
+        else:
+            exec_time = EXEC_TIME
+        self._queue(self._codes[mode][value], exec_time)
+
+    def _send_data(self, data):
+        """Send a run of data bytes to the display."""
+        lanes = self._lanes
+        data = bytes(data)
+        encoded = bytearray(4 * len(data))
+        for i in range(4):
+            encoded[i::4] = data.translate(lanes[i])
+        self._queue(encoded, EXEC_TIME_DATA)
+
+    def _queue(self, data, exec_time):
+        """Transmit encoded port states, or add them to the current batch.
+        ``exec_time`` is the execution time of the last instruction in them."""
+        if self._tx is None:
+            self._transmit(data, exec_time)
+            return
+        if self._tx and self._tx_exec > self._tx_gap:
+            self._transmit(self._tx, self._tx_exec)
+            self._tx = bytearray()
+        self._tx += data
+        self._tx_exec = exec_time
+
+    def _load_encodings(self):
+        """Pick the encoding tables for the current backlight state."""
+        self._codes = {}
+        for mode in (RS_INSTRUCTION, RS_DATA):
+            self._codes[mode] = encoding(mode, self.backlight_state)[0]
+        self._lanes = encoding(RS_DATA, self.backlight_state)[1]
+
+    def _pulse(self, value):
+        """Return the E-high/E-low port states for a single nibble."""
         if self.backlight_state:
-           value |= PIN_BKLIGHT
+            value |= PIN_BKLIGHT
         else:
-           value &= ~PIN_BKLIGHT
-        self.bus.write_byte(self.address, value | PIN_E)
-        usleep(1)
-        self.bus.write_byte(self.address, value & ~PIN_E)
-        usleep(100)
+            value &= ~PIN_BKLIGHT
+        return bytearray((value | PIN_E, value & ~PIN_E))
+
+    def _transmit(self, data, exec_time):
+        """Stream port expander states to the bus. The PCF8574 latches every
+        byte of a write onto its port, in order.
+
+        ``exec_time`` is the execution time in µs of the last instruction
+        in ``data``."""
+        self._wait_ready()
+        self.bus.write_bytes(self.address, data)
+        self._ready_at = monotonic() + exec_time / 1e6
+
+    def _wait_ready(self):
+        """Wait until the controller can take the next instruction.
+
+        The address byte and the first nibble's E-high state go out before
+        the first falling edge of E, that part of the wait is spent on the
+        bus already. At 100kHz this covers any instruction but clear and
+        home, so ordinary writes never wait. Longer waits poll the busy
+        flag if enabled, and sleep otherwise."""
+        now = monotonic()
+        remaining = self._ready_at - 3 * self._byte_time - now
+        if remaining <= 0:
+            return
+        if not self._busy_flag:
+            time.sleep(remaining)
+            return
+        deadline = now + remaining + BUSY_TIMEOUT / 1e6
+        while self._read_status()[0] and monotonic() < deadline:
+            pass
+
+    def _read_status(self):
+        """Read the busy flag and address counter, returned as a
+        ``(busy, address)`` tuple.
+
+        RW is raised with the data lines released (high), then each nibble
+        is read from the port while E is high."""
+        bl = PIN_BKLIGHT if self.backlight_state else 0x00
+        port = 0xF0 | PIN_RW | bl
+        value = 0
+        for shift in (0, 4):
+            self.bus.write_bytes(self.address, [port, port | PIN_E])
+            value |= (self.bus.read_bytes(self.address, 1)[0] & 0xF0) >> shift
+        self.bus.write_bytes(self.address, [port, bl])
+        return bool(value & 0x80), value & 0x7F
+
+    def _probe_busy_flag(self):
+        """Return whether the busy flag can be read.
+
+        Right after initialization the address counter is 0. When RW is tied
+        to ground the port reads back as written (busy, address 0x7F) and the
+        two E strobes write a stray "set DDRAM address" instruction, which is
+        undone here."""
+        time.sleep(max(0, self._ready_at - monotonic()))
+        busy, address = self._read_status()
+        if not busy and address == 0:
+            return True
+        self._ready_at = monotonic() + EXEC_TIME / 1e6
+        self._busy_flag = False
+        self._set_address(0)
+        return False
+
+    def _write4bits(self, value, exec_time):
+        """Write 4 bits of data into the data bus."""
+        self._transmit(self._pulse(value), exec_time)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Several displays driven together.
+
+A :class:`DisplayManager` creates its displays in parallel: most of the
+initialization is waiting for the controllers, and the waits overlap. It
+then gives each bus one :class:`~RPLCD_i2c.writer.Writer` shared by the
+displays on it. Displays on the same bus take turns on its writer thread,
+displays on different buses are updated at the same time.
+
+Example::
+
+    >>> displays = DisplayManager({
+    ...     'clock': {'address': 0x27, 'port': 1},
+    ...     'weather': {'address': 0x3F, 'port': 1},
+    ...     'status': {'address': 0x27, 'port': 3, 'cols': 20, 'rows': 4},
+    ... }, cols=16, rows=2)
+    >>> with displays.frame('clock') as lcd:
+    ...     lcd.write_string('12:00')
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import threading
+from contextlib import contextmanager
+
+from .bus import LockedTransport
+from .lcd import CharLCD
+from .writer import Writer
+
+
+### MAIN ###
+
+class DisplayManager(object):
+
+    def __init__(self, displays, **defaults):
+        """
+        Create displays in parallel, one writer thread per bus.
+
+        Args:
+            displays:
+                Dict mapping display names to the :class:`~RPLCD_i2c.CharLCD`
+                arguments of each display. Displays passed the same ``bus``
+                transport, or else the same ``port``, share a writer. A
+                transport shared this way is wrapped in a
+                :class:`~RPLCD_i2c.bus.LockedTransport`.
+            defaults:
+                :class:`~RPLCD_i2c.CharLCD` arguments common to all displays.
+
+        Raises:
+            Exception:
+                The first error raised while creating a display. The
+                displays created successfully are closed.
+
+        """
+        if 'threaded' in defaults or any('threaded' in args for args in displays.values()):
+            raise ValueError('The manager starts the writer threads itself.')
+        self.displays = {}
+        self._writers = {}
+        errors = []
+
+        def create(name, args):
+            try:
+                self.displays[name] = CharLCD(**args)
+            except Exception as e:
+                errors.append(e)
+
+        configs = [(name, dict(defaults, **config)) for name, config in sorted(displays.items())]
+        # Displays initialize at the same time, so transports shared between
+        # them need a lock
+        buses = [id(args['bus']) for name, args in configs if args.get('bus') is not None]
+        locked = {}
+
+        threads = []
+        for name, args in configs:
+            args['threaded'] = self._writer(args)
+            bus = args.get('bus')
+            if bus is not None and buses.count(id(bus)) > 1:
+                if id(bus) not in locked:
+                    locked[id(bus)] = LockedTransport(bus)
+                args['bus'] = locked[id(bus)]
+            thread = threading.Thread(target=create, args=(name, args),
+                                      name='lcd-init-{0}'.format(name))
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            self.close()
+            raise errors[0]
+
+    def _writer(self, args):
+        """Return the writer of the bus a display is on, starting it if needed."""
+        bus = args.get('bus')
+        key = ('port', args.get('port', 1)) if bus is None else ('bus', id(bus))
+        if key not in self._writers:
+            self._writers[key] = Writer(name='lcd-writer-{0}-{1}'.format(*key))
+        return self._writers[key]
+
+    def __getitem__(self, name):
+        return self.displays[name]
+
+    def __iter__(self):
+        return iter(sorted(self.displays))
+
+    def __len__(self):
+        return len(self.displays)
+
+    @contextmanager
+    def frame(self, name):
+        """Context manager to draw a frame on one display.
+
+        Drawing in the block goes to the display's framebuffer, and is
+        flushed at the end. The writer thread does not read the framebuffer
+        meanwhile, so a half drawn frame never reaches the display.
+
+        Example:
+
+        >>> with displays.frame('clock') as lcd:
+            lcd.cursor_pos = (0, 0)
+            lcd.write_string('12:00')
+
+        """
+        lcd = self.displays[name]
+        with lcd._lock:
+            yield lcd
+        lcd.flush()
+
+    def flush(self):
+        """Queue a flush of every display."""
+        for lcd in self.displays.values():
+            lcd.flush()
+
+    def wait(self):
+        """Block until everything queued so far has reached the displays."""
+        for writer in self._writers.values():
+            writer.wait()
+
+    def close(self, clear=False):
+        """Close every display, then stop the writer threads."""
+        for lcd in self.displays.values():
+            lcd.close(clear)
+        for writer in self._writers.values():
+            writer.close()
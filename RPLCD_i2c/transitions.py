@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Frame-timed animations.
+
+A :class:`Transition` works out what each of its frames sends when it is
+created. :meth:`Transition.play` then shows frame ``i`` at ``start + i / fps``
+on the monotonic clock, so the speed does not depend on how long the bus
+takes. Frames that are already late when the previous one is done are
+dropped: the next frame drawn goes straight to the latest state due. The
+last frame is always drawn.
+
+Frames are drawn into the framebuffer and flushed, or sent right away when
+not in framebuffer mode. In threaded mode a flush only queues the frame,
+frames the writer thread cannot keep up with are merged.
+
+Example::
+
+    >>> lcd.page = 1
+    >>> lcd.write_string('Next screen')
+    >>> stats = Slide(lcd, 1).play(fps=20)
+    >>> stats.fps, stats.dropped
+    (19.97, 0)
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import time
+from collections import namedtuple
+
+from .lcd import monotonic
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+### NAMEDTUPLES ###
+
+# Outcome of :meth:`Transition.play`: number of frames, how many were drawn
+# and dropped, time taken in seconds, and target and achieved frame rate
+Stats = namedtuple('Stats', 'frames shown dropped duration target_fps fps')
+
+
+### MAIN ###
+
+class Transition(object):
+
+    #: Frame rate used when :meth:`play` is not given one
+    fps = 20
+
+    def __init__(self, lcd, frames):
+        """
+        Base class of the animations. Subclasses implement :meth:`_draw`.
+
+        Args:
+            lcd:
+                The :class:`~RPLCD_i2c.CharLCD` instance.
+            frames:
+                Number of frames.
+
+        """
+        self.lcd = lcd
+        self.frames = frames
+
+    def play(self, fps=None):
+        """Show every frame at its deadline and return :class:`Stats`.
+
+        The call returns one frame period after the last frame was drawn,
+        so that transitions played back to back keep their pace.
+
+        """
+        fps = fps or self.fps
+        assert fps > 0, 'The frame rate must be positive.'
+        lcd = self.lcd
+        shown = 0
+        previous = -1
+        start = monotonic()
+        while previous < self.frames - 1:
+            # Latest frame due, never past the last one
+            frame = min(int((monotonic() - start) * fps), self.frames - 1)
+            if frame > previous:
+                with lcd._lock, lcd._batched():
+                    self._draw(frame, previous)
+                lcd.flush()
+                shown += 1
+                previous = frame
+            delay = start + (previous + 1) / fps - monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        duration = monotonic() - start
+        return Stats(self.frames, shown, self.frames - shown, duration, fps,
+                     shown / duration if duration > 0 else fps)
+
+    def _draw(self, frame, previous):
+        """Bring the display from frame ``previous`` (-1 before the first
+        one) to frame ``frame``."""
+        raise NotImplementedError
+
+
+class Slide(Transition):
+
+    def __init__(self, lcd, page):
+        """
+        Slide a page into view by shifting the display one column per
+        frame, the shortest way round. See :meth:`~RPLCD_i2c.CharLCD.show_page`.
+
+        Args:
+            lcd:
+                The :class:`~RPLCD_i2c.CharLCD` instance.
+            page:
+                The page to bring into view.
+
+        """
+        self._amount = lcd._page_shift(page)
+        self._step = 1 if self._amount > 0 else -1
+        super(Slide, self).__init__(lcd, abs(self._amount))
+
+    def play(self, fps=None):
+        # The page has to be complete before it comes into view
+        self.lcd.flush()
+        return super(Slide, self).play(fps)
+
+    def _draw(self, frame, previous):
+        self.lcd.shift_display(self._step * (frame - previous))
+
+
+class Wipe(Transition):
+
+    def __init__(self, lcd, lines, reverse=False):
+        """
+        Replace the current page column by column.
+
+        Args:
+            lcd:
+                The :class:`~RPLCD_i2c.CharLCD` instance.
+            lines:
+                The new text of each row, padded or cut to the display width.
+            reverse:
+                Whether to wipe from right to left. Default: False.
+
+        """
+        assert len(lines) <= lcd.lcd.rows, 'More lines than display rows.'
+        cols = lcd.lcd.cols
+        self._offsets = lcd._row_offsets
+        self._cells = [lcd.charmap.encode(line.ljust(cols)[:cols]) for line in lines]
+        self._reverse = reverse
+        super(Wipe, self).__init__(lcd, cols)
+
+    def _draw(self, frame, previous):
+        # Columns revealed since the previous frame
+        start, stop = previous + 1, frame + 1
+        if self._reverse:
+            start, stop = self.frames - stop, self.frames - start
+        for offset, cells in zip(self._offsets, self._cells):
+            self.lcd._write_cells(offset + start, cells[start:stop])
+
+
+class Marquee(Transition):
+
+    def __init__(self, lcd, text, row=0):
+        """
+        Scroll text across a row, entering on the right and leaving on the
+        left, one column per frame.
+
+        Args:
+            lcd:
+                The :class:`~RPLCD_i2c.CharLCD` instance.
+            text:
+                The text to scroll.
+            row:
+                The row of the current page to scroll it on. Default: 0.
+
+        """
+        cols = lcd.lcd.cols
+        self._address = lcd._row_offsets[row]
+        strip = lcd.charmap.encode(' ' * cols + text + ' ' * cols)
+        self._windows = [strip[start:start + cols] for start in range(1, len(text) + cols + 1)]
+        super(Marquee, self).__init__(lcd, len(self._windows))
+
+    def _draw(self, frame, previous):
+        self.lcd._write_cells(self._address, self._windows[frame])
+
+
+class Fade(Transition):
+
+    # Switching the backlight is a single byte on the bus, and dithering
+    # only looks like dimming at high rates
+    fps = 100
+
+    def __init__(self, lcd, fade_in=False, frames=50):
+        """
+        Fade the backlight out or in by switching it on for a decreasing or
+        increasing share of the frames.
+
+        The backlight can only be on or off, so the brightness of each frame
+        is dithered: the error of switching fully on or off is carried over
+        to the next frames. Play at 100 fps or more to avoid flicker.
+
+        Args:
+            lcd:
+                The :class:`~RPLCD_i2c.CharLCD` instance.
+            fade_in:
+                Whether to fade in instead of out. Default: False.
+            frames:
+                Number of frames. Default: 50.
+
+        """
+        states = []
+        error = 0
+        for frame in range(1, frames + 1):
+            level = frame / frames if fade_in else 1 - frame / frames
+            error += level
+            state = error >= 0.5
+            error -= state
+            states.append(state)
+        self._states = states
+        super(Fade, self).__init__(lcd, frames)
+
+    def _draw(self, frame, previous):
+        state = self._states[frame]
+        if previous < 0 or state != self._states[previous]:
+            self.lcd.set_backlight(state)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Background writer thread.
+
+A :class:`Writer` talks to the bus on behalf of the code drawing on a
+display: operations are submitted from any thread and return right away,
+the writer thread runs them one after the other in submission order.
+
+Operations submitted with a ``key`` are coalesced: submitting one while
+another with the same key is still waiting in the queue does nothing. A
+framebuffer flush submitted this way reads the framebuffer only when it
+runs, so however often producers flush while the bus is busy, only the
+latest contents of each cell get transmitted.
+
+Example::
+
+    >>> writer = Writer()
+    >>> writer.submit(bus.write_bytes, (0x27, [PIN_BKLIGHT]))
+    >>> writer.close()
+
+:class:`~RPLCD_i2c.CharLCD` starts one when created with ``threaded=True``,
+:class:`~RPLCD_i2c.manager.DisplayManager` one per bus, shared by the
+displays on it.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import threading
+from collections import deque
+
+
+class Writer(object):
+
+    def __init__(self, name='lcd-writer'):
+        """
+        Start a writer thread.
+
+        Args:
+            name:
+                Name of the thread. Default: 'lcd-writer'.
+
+        """
+        self.error = None
+        self._queue = deque()
+        self._pending = set()
+        self._running = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def is_current(self):
+        """Whether the calling code runs on the writer thread."""
+        return threading.current_thread() is self._thread
+
+    def submit(self, function, args=(), key=None):
+        """Queue ``function(*args)`` to run on the writer thread.
+
+        If ``key`` is given and an operation with the same key is waiting to
+        run, nothing is queued.
+
+        Raises:
+            ValueError:
+                Raised when the writer has been closed.
+            Exception:
+                An error raised by a previous operation, see :attr:`error`.
+
+        """
+        with self._cond:
+            self._raise_error()
+            if self._closed:
+                raise ValueError('The writer has been closed.')
+            if key is not None:
+                if key in self._pending:
+                    return
+                self._pending.add(key)
+            self._queue.append((function, args, key))
+            self._cond.notify_all()
+
+    def wait(self):
+        """Block until every operation submitted so far has run."""
+        with self._cond:
+            while self._queue or self._running:
+                self._cond.wait()
+            self._raise_error()
+
+    def close(self):
+        """Run the remaining operations and stop the thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if not self.is_current():
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        """Re-raise the first error an operation raised, only once."""
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                function, args, key = self._queue.popleft()
+                # Submitting again from now on queues a new run, which will
+                # see whatever changed while this one is running
+                self._pending.discard(key)
+                self._running = True
+            try:
+                function(*args)
+            except Exception as e:
+                with self._cond:
+                    if self.error is None:
+                        self.error = e
+            finally:
+                with self._cond:
+                    self._running = False
+                    self._cond.notify_all()
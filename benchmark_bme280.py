@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compare bme280.compensate() in a loop with bme280.compensateBatch(), and
+the same for their integer versions.
+
+Usage: benchmark_bme280.py [samples]
+
+Random data registers are compensated with the datasheet example
+calibration. The scalar loop only runs on the first 100000 samples, and
+the batch results are checked bit for bit against it.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import struct
+import sys
+import timeit
+
+import numpy
+
+import bme280
+
+SCALAR_SAMPLES = 100000
+
+CALIBRATION = bme280.parseCalibration(
+    bytearray(struct.pack('<HhhHhhhhhhhh', 27504, 26435, -1000, 36477, -10685, 3024,
+                          2855, 140, -7, 15500, -14600, 6000)),
+    bytearray([75]), bytearray([0x6c, 0x01, 0x00, 0x13, 0x28, 0x03, 0x1e]))
+
+
+def best(function, repeat=3):
+    """Best time of ``repeat`` calls, in seconds."""
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    raw = numpy.random.RandomState(0).randint(0, 256, (samples, 8)).astype(numpy.uint8)
+    rows = [[int(value) for value in row] for row in raw[:SCALAR_SAMPLES]]
+
+    scalar_time = best(lambda: [bme280.compensate(CALIBRATION, row) for row in rows], 1)
+    batch_time = best(lambda: bme280.compensateBatch(raw, CALIBRATION))
+    scalar_int_time = best(lambda: [bme280.compensateInt(CALIBRATION, row) for row in rows], 1)
+    batch_int_time = best(lambda: bme280.compensateBatchInt(raw, CALIBRATION))
+
+    scalar = numpy.array([bme280.compensate(CALIBRATION, row) for row in rows])
+    batch = bme280.compensateBatch(raw[:SCALAR_SAMPLES], CALIBRATION)
+    identical = (scalar.view(numpy.uint64) == batch.view(numpy.uint64)).all()
+
+    scalar_rate = len(rows) / scalar_time
+    batch_rate = samples / batch_time
+    print('Scalar loop         : {0:>12,.0f} samples/s ({1:,} samples)'.format(scalar_rate, len(rows)))
+    print('Batch               : {0:>12,.0f} samples/s ({1:,} samples)'.format(batch_rate, samples))
+    print('Speedup             : {0:.1f}x'.format(batch_rate / scalar_rate))
+    print('Integer scalar loop : {0:>12,.0f} samples/s'.format(len(rows) / scalar_int_time))
+    print('Integer batch       : {0:>12,.0f} samples/s'.format(samples / batch_int_time))
+    print('Bit exact           :', 'yes' if identical else 'NO')
+    return 0 if identical else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
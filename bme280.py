@@ -18,17 +18,86 @@
 # http://www.raspberrypi-spy.co.uk/
 #
 #--------------------------------------
-import smbus
+from __future__ import print_function
+
+import json
+import os
 import time
+from collections import namedtuple
 from ctypes import c_short
 from ctypes import c_byte
 from ctypes import c_ubyte
 
+try:
+  import numpy
+except ImportError:  # only needed by compensateBatch and compensateBatchInt
+  numpy = None
+
+try:
+  monotonic = time.monotonic
+except AttributeError:  # Python 2
+  monotonic = time.time
+
+from RPLCD_i2c.bus import shared_bus
+
 DEVICE = 0x76 # Default device I2C address
+PORT = 1      # Rev 2 Pi, Pi 2 & Pi 3 uses bus 1
+              # Rev 1 Pi uses bus 0
+
+_bus = None   # Default transport, shared with the LCD on the same port
+
+# Register Addresses
+REG_DATA = 0xF7
+REG_CONTROL = 0xF4
+REG_CONFIG  = 0xF5
+REG_STATUS  = 0xF3
+REG_CONTROL_HUM = 0xF2
+
+REG_HUM_MSB = 0xFD
+REG_HUM_LSB = 0xFE
+
+# Oversample setting - page 27
+OVERSAMPLE_TEMP = 2
+OVERSAMPLE_PRES = 2
+OVERSAMPLE_HUM = 2
+
+# Sensor modes
+MODE_SLEEP = 0
+MODE_FORCED = 1
+MODE_NORMAL = 3
+MODE = MODE_FORCED
+
+# Status register bit set while a conversion is running
+STATUS_MEASURING = 0x08
+
+# Maximum measurement time in seconds - page 51
+# (x2 oversampling for temperature, pressure and humidity)
+MEASURE_TIME = (1.25 + 2.3 * 2 + 2.3 * 2 + 0.575 + 2.3 * 2 + 0.575) / 1000
 
+# How often to check the status register once a measurement is due, and
+# how long past due to give up, in seconds
+POLL_INTERVAL = 0.0005
+POLL_TIMEOUT = 0.1
 
-bus = smbus.SMBus(1) # Rev 2 Pi, Pi 2 & Pi 3 uses bus 1
-                     # Rev 1 Pi uses bus 0
+# Config register codes of the normal mode standby times (ms) and of the
+# IIR filter coefficients
+STANDBY = {0.5: 0, 62.5: 1, 125: 2, 250: 3, 500: 4, 1000: 5, 10: 6, 20: 7}
+FILTER = {0: 0, 2: 1, 4: 2, 8: 3, 16: 4}
+
+# Compensation parameters decoded from the calibration data
+Calibration = namedtuple('Calibration',
+  'dig_T1 dig_T2 dig_T3 '
+  'dig_P1 dig_P2 dig_P3 dig_P4 dig_P5 dig_P6 dig_P7 dig_P8 dig_P9 '
+  'dig_H1 dig_H2 dig_H3 dig_H4 dig_H5 dig_H6')
+
+def getBus(bus=None):
+  # return the given transport, or the default one on PORT
+  global _bus
+  if bus is not None:
+    return bus
+  if _bus is None:
+    _bus = shared_bus(PORT)
+  return _bus
 
 def getShort(data, index):
   # return two bytes from data as a signed 16-bit value
@@ -50,35 +119,31 @@ def getUChar(data,index):
   result =  data[index] & 0xFF
   return result
 
-def readBME280ID(addr=DEVICE):
+def readBME280ID(addr=DEVICE, bus=None):
   # Chip ID Register Address
   REG_ID     = 0xD0
-  (chip_id, chip_version) = bus.read_i2c_block_data(addr, REG_ID, 2)
+  (chip_id, chip_version) = getBus(bus).read_block(addr, REG_ID, 2)
   return (chip_id, chip_version)
 
-def readBME280All(addr=DEVICE):
-  # Register Addresses
-  REG_DATA = 0xF7
-  REG_CONTROL = 0xF4
-  REG_CONFIG  = 0xF5
-
-  REG_HUM_MSB = 0xFD
-  REG_HUM_LSB = 0xFE
-
-  # Oversample setting - page 27
-  OVERSAMPLE_TEMP = 2
-  OVERSAMPLE_PRES = 2
-  MODE = 1
-
-  control = OVERSAMPLE_TEMP<<5 | OVERSAMPLE_PRES<<2 | MODE
-  bus.write_byte_data(addr, REG_CONTROL, control)
+def startBME280(addr=DEVICE, bus=None, mode=MODE):
+  # start a forced mode measurement, return how long it takes in seconds
+  # humidity settings only take effect with the next control write
+  bus = getBus(bus)
+  control = OVERSAMPLE_TEMP<<5 | OVERSAMPLE_PRES<<2 | mode
+  with bus.transaction():
+    bus.write_block(addr, REG_CONTROL_HUM, [OVERSAMPLE_HUM])
+    bus.write_block(addr, REG_CONTROL, [control])
+  return MEASURE_TIME
 
+def readCalibrationBlocks(addr, bus):
   # Read blocks of calibration data from EEPROM
   # See Page 22 data sheet
-  cal1 = bus.read_i2c_block_data(addr, 0x88, 24)
-  cal2 = bus.read_i2c_block_data(addr, 0xA1, 1)
-  cal3 = bus.read_i2c_block_data(addr, 0xE1, 7)
+  cal1 = bus.read_block(addr, 0x88, 24)
+  cal2 = bus.read_block(addr, 0xA1, 1)
+  cal3 = bus.read_block(addr, 0xE1, 7)
+  return cal1, cal2, cal3
 
+def parseCalibration(cal1, cal2, cal3):
   # Convert byte data to word values
   dig_T1 = getUShort(cal1, 0)
   dig_T2 = getShort(cal1, 2)
@@ -108,14 +173,31 @@ def readBME280All(addr=DEVICE):
 
   dig_H6 = getChar(cal3, 6)
 
+  return Calibration(dig_T1, dig_T2, dig_T3,
+                     dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9,
+                     dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6)
+
+def readCalibration(addr=DEVICE, bus=None):
+  # read and decode the calibration data
+  bus = getBus(bus)
+  with bus.transaction():
+    return parseCalibration(*readCalibrationBlocks(addr, bus))
+
+def compensate(cal, data):
+  # turn the 8 data registers into temperature (C), pressure (hPa)
+  # and humidity (%)
+  (dig_T1, dig_T2, dig_T3,
+   dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9,
+   dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6) = cal
+
   # Read temperature/pressure/humidity
-  data = bus.read_i2c_block_data(addr, REG_DATA, 8)
   pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
   temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
   hum_raw = (data[6] << 8) | data[7]
 
   #Refine temperature
-  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
+  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11
+  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
   t_fine = var1+var2
   temperature = float(((t_fine * 5) + 128) >> 8);
 
@@ -146,17 +228,353 @@ def readBME280All(addr=DEVICE):
 
   return temperature/100.0,pressure/100.0,humidity
 
+def divTrunc(a, b):
+  # integer division rounding towards zero, like C's
+  q = abs(a) // abs(b)
+  return q if (a < 0) == (b < 0) else -q
+
+def compensateInt(cal, data):
+  # integer only compensation, after Bosch's reference code (32 bit for
+  # temperature and humidity, 64 bit for pressure). Returns temperature
+  # in 0.01 C, pressure in Pa/256 and humidity in %/1024, as integers.
+  (dig_T1, dig_T2, dig_T3,
+   dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9,
+   dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6) = cal
+
+  pres_raw = (data[0] << 12) | (data[1] << 4) | (data[2] >> 4)
+  temp_raw = (data[3] << 12) | (data[4] << 4) | (data[5] >> 4)
+  hum_raw = (data[6] << 8) | data[7]
+
+  # Temperature, the same as the float path
+  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11
+  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
+  t_fine = var1+var2
+  temperature = ((t_fine * 5) + 128) >> 8
+
+  # Pressure
+  var1 = t_fine - 128000
+  var2 = var1 * var1 * dig_P6
+  var2 = var2 + ((var1 * dig_P5) << 17)
+  var2 = var2 + (dig_P4 << 35)
+  var1 = ((var1 * var1 * dig_P3) >> 8) + ((var1 * dig_P2) << 12)
+  var1 = (((1 << 47) + var1) * dig_P1) >> 33
+  if var1 == 0:
+    pressure = 0
+  else:
+    pressure = 1048576 - pres_raw
+    pressure = divTrunc(((pressure << 31) - var2) * 3125, var1)
+    var1 = (dig_P9 * (pressure >> 13) * (pressure >> 13)) >> 25
+    var2 = (dig_P8 * pressure) >> 19
+    pressure = ((pressure + var1 + var2) >> 8) + (dig_P7 << 4)
+
+  # Humidity
+  humidity = t_fine - 76800
+  humidity = (((((hum_raw << 14) - (dig_H4 << 20) - (dig_H5 * humidity)) + 16384) >> 15) *
+              (((((((humidity * dig_H6) >> 10) * (((humidity * dig_H3) >> 11) + 32768)) >> 10) +
+                 2097152) * dig_H2 + 8192) >> 14))
+  humidity = humidity - (((((humidity >> 15) * (humidity >> 15)) >> 7) * dig_H1) >> 4)
+  humidity = min(max(humidity, 0), 419430400) >> 12
+
+  return temperature,pressure,humidity
+
+def splitRaw(raw):
+  # pressure, temperature and humidity ADC values of an (N, 8) array of
+  # data registers or an (N, 3) array of ADC values, as int64 columns
+  raw = numpy.asarray(raw)
+  if raw.ndim != 2 or raw.shape[1] not in (3, 8):
+    raise ValueError('Expected an (N, 8) or (N, 3) array of raw samples.')
+  data = raw.astype(numpy.int64)
+  if raw.shape[1] == 3:
+    return data[:, 0], data[:, 1], data[:, 2]
+  pres_raw = (data[:, 0] << 12) | (data[:, 1] << 4) | (data[:, 2] >> 4)
+  temp_raw = (data[:, 3] << 12) | (data[:, 4] << 4) | (data[:, 5] >> 4)
+  hum_raw = (data[:, 6] << 8) | data[:, 7]
+  return pres_raw, temp_raw, hum_raw
+
+def compensateBatch(raw, cal):
+  # compensate() over many samples at once, using numpy. raw is an (N, 8)
+  # array of data registers, or an (N, 3) array of pressure, temperature
+  # and humidity ADC values. Returns an (N, 3) array of temperature (C),
+  # pressure (hPa) and humidity (%).
+  #
+  # The operations are the same as in compensate(), in the same order and
+  # on the same types (int64 for t_fine, float64 after), so the results
+  # are bit for bit the same.
+  if numpy is None:
+    raise ImportError('compensateBatch requires numpy.')
+  (dig_T1, dig_T2, dig_T3,
+   dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9,
+   dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6) = [int(value) for value in cal]
+
+  pres_raw, temp_raw, hum_raw = splitRaw(raw)
+
+  # Refine temperature, >> rounds towards minus infinity like Python's
+  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11
+  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
+  t_fine = var1+var2
+  temperature = (((t_fine * 5) + 128) >> 8).astype(numpy.float64)
+
+  # Refine pressure and adjust for temperature
+  var1 = t_fine / 2.0 - 64000.0
+  var2 = var1 * var1 * dig_P6 / 32768.0
+  var2 = var2 + var1 * dig_P5 * 2.0
+  var2 = var2 / 4.0 + dig_P4 * 65536.0
+  var1 = (dig_P3 * var1 * var1 / 524288.0 + dig_P2 * var1) / 524288.0
+  var1 = (1.0 + var1 / 32768.0) * dig_P1
+  invalid = var1 == 0
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    pressure = 1048576.0 - pres_raw
+    pressure = ((pressure - var2 / 4096.0) * 6250.0) / var1
+    var1 = dig_P9 * pressure * pressure / 2147483648.0
+    var2 = pressure * dig_P8 / 32768.0
+    pressure = pressure + (var1 + var2 + dig_P7) / 16.0
+  pressure[invalid] = 0
+
+  # Refine humidity
+  humidity = t_fine - 76800.0
+  humidity = (hum_raw - (dig_H4 * 64.0 + dig_H5 / 16384.8 * humidity)) * (dig_H2 / 65536.0 * (1.0 + dig_H6 / 67108864.0 * humidity * (1.0 + dig_H3 / 67108864.0 * humidity)))
+  humidity = humidity * (1.0 - dig_H1 * humidity / 524288.0)
+  # clamped with the same comparisons, -0.0 and nan stay as they are
+  humidity = numpy.where(humidity > 100, 100.0, numpy.where(humidity < 0, 0.0, humidity))
+
+  return numpy.column_stack((temperature/100.0, pressure/100.0, humidity))
+
+def compensateBatchInt(raw, cal):
+  # compensateInt() over many samples at once, using numpy int64, for the
+  # same raw arrays as compensateBatch(). Returns an (N, 3) int64 array of
+  # temperature (0.01 C), pressure (Pa/256) and humidity (%/1024).
+  if numpy is None:
+    raise ImportError('compensateBatchInt requires numpy.')
+  (dig_T1, dig_T2, dig_T3,
+   dig_P1, dig_P2, dig_P3, dig_P4, dig_P5, dig_P6, dig_P7, dig_P8, dig_P9,
+   dig_H1, dig_H2, dig_H3, dig_H4, dig_H5, dig_H6) = [int(value) for value in cal]
+
+  pres_raw, temp_raw, hum_raw = splitRaw(raw)
+
+  # Temperature
+  var1 = ((((temp_raw>>3)-(dig_T1<<1)))*(dig_T2)) >> 11
+  var2 = (((((temp_raw>>4) - (dig_T1)) * ((temp_raw>>4) - (dig_T1))) >> 12) * (dig_T3)) >> 14
+  t_fine = var1+var2
+  temperature = ((t_fine * 5) + 128) >> 8
+
+  # Pressure, numpy's // rounds down where divTrunc() rounds towards zero
+  var1 = t_fine - 128000
+  var2 = var1 * var1 * dig_P6
+  var2 = var2 + ((var1 * dig_P5) << 17)
+  var2 = var2 + (dig_P4 << 35)
+  var1 = ((var1 * var1 * dig_P3) >> 8) + ((var1 * dig_P2) << 12)
+  var1 = (((1 << 47) + var1) * dig_P1) >> 33
+  invalid = var1 == 0
+  var1[invalid] = 1
+  pressure = 1048576 - pres_raw
+  dividend = ((pressure << 31) - var2) * 3125
+  pressure = numpy.abs(dividend) // numpy.abs(var1)
+  pressure = numpy.where((dividend < 0) != (var1 < 0), -pressure, pressure)
+  var1 = (dig_P9 * (pressure >> 13) * (pressure >> 13)) >> 25
+  var2 = (dig_P8 * pressure) >> 19
+  pressure = ((pressure + var1 + var2) >> 8) + (dig_P7 << 4)
+  pressure[invalid] = 0
+
+  # Humidity
+  humidity = t_fine - 76800
+  humidity = (((((hum_raw << 14) - (dig_H4 << 20) - (dig_H5 * humidity)) + 16384) >> 15) *
+              (((((((humidity * dig_H6) >> 10) * (((humidity * dig_H3) >> 11) + 32768)) >> 10) +
+                 2097152) * dig_H2 + 8192) >> 14))
+  humidity = humidity - (((((humidity >> 15) * (humidity >> 15)) >> 7) * dig_H1) >> 4)
+  humidity = numpy.clip(humidity, 0, 419430400) >> 12
+
+  return numpy.column_stack((temperature, pressure, humidity))
+
+def readBME280Data(addr=DEVICE, bus=None):
+  # read and compensate the last measurement, calibration data included,
+  # without other devices' traffic in between
+  bus = getBus(bus)
+  with bus.transaction():
+    cal = parseCalibration(*readCalibrationBlocks(addr, bus))
+    data = bus.read_block(addr, REG_DATA, 8)
+  return compensate(cal, data)
+
+def readBME280All(addr=DEVICE, bus=None):
+  time.sleep(startBME280(addr, bus))
+  return readBME280Data(addr, bus)
+
+def cacheKey(addr, bus, chip_id):
+  # calibration cache entry of a sensor: port, address and chip ID
+  return '%s-0x%02x-0x%02x' % (getattr(bus, 'port', '?'), addr, chip_id)
+
+def loadCalibration(path, key):
+  # return the cached calibration stored under key, or None
+  try:
+    with open(path) as f:
+      cache = json.load(f)
+  except (IOError, ValueError):
+    return None
+  values = cache.get(key)
+  if values is None or len(values) != len(Calibration._fields):
+    return None
+  return Calibration(*values)
+
+def saveCalibration(path, key, cal):
+  # add a calibration to the cache file, replacing it in one step
+  try:
+    with open(path) as f:
+      cache = json.load(f)
+  except (IOError, ValueError):
+    cache = {}
+  cache[key] = list(cal)
+  tmp = path + '.tmp'
+  with open(tmp, 'w') as f:
+    json.dump(cache, f, sort_keys=True)
+  os.rename(tmp, path)
+
+class BME280(object):
+  # A sensor whose calibration data is read once, each sample is then a
+  # single 8 byte read.
+  #
+  # cache is the path of a JSON file keeping calibration data by port,
+  # address and chip ID across runs, so that later runs skip reading it.
+  # The chip ID is the same for every BME280: delete the file after
+  # swapping a sensor for another one.
+  #
+  # Measurements are split in two: trigger() starts a forced mode
+  # conversion and returns right away, collect() fetches it once done.
+  # After startNormal() the sensor measures continuously on its own, and
+  # readLatest() fetches the last completed measurement.
+  #
+  # With integer=True, samples are compensated with compensateInt(), no
+  # floating point involved until the final conversion to C, hPa and %.
+
+  def __init__(self, addr=DEVICE, bus=None, cache=None, integer=False):
+    self.addr = addr
+    self.integer = integer
+    self.bus = getBus(bus)
+    self.chip_id, self.chip_version = readBME280ID(addr, self.bus)
+    key = cacheKey(addr, self.bus, self.chip_id)
+    self.calibration = loadCalibration(cache, key) if cache else None
+    if self.calibration is None:
+      self.calibration = readCalibration(addr, self.bus)
+      if cache:
+        saveCalibration(cache, key, self.calibration)
+    # the sensor powers up in sleep mode, _due is when the pending
+    # conversion finishes
+    self.mode = MODE_SLEEP
+    self._due = None
+    # applies from the next control write on
+    self.bus.write_block(addr, REG_CONTROL_HUM, [OVERSAMPLE_HUM])
+
+  def trigger(self):
+    # start a forced mode measurement, return how long it takes in seconds
+    self._setMode(MODE_FORCED)
+    self._due = monotonic() + MEASURE_TIME
+    return MEASURE_TIME
+
+  def measuring(self):
+    # whether a conversion is running
+    return bool(self.bus.read_block(self.addr, REG_STATUS, 1)[0] & STATUS_MEASURING)
+
+  def ready(self):
+    # whether collect() or readLatest() would return without waiting
+    return self._due is None or (monotonic() >= self._due and not self.measuring())
+
+  def collect(self, wait=True):
+    # read the measurement started by trigger(), waiting for the
+    # conversion to finish, or returning None if wait is False
+    data = self.collectRaw(wait)
+    if data is None:
+      return None
+    return self.compensate(data)
+
+  def collectRaw(self, wait=True):
+    # same as collect(), returning the 8 data registers uncompensated
+    if self._due is None and self.mode != MODE_NORMAL:
+      raise ValueError('No measurement was triggered.')
+    if not self._wait(wait):
+      return None
+    return self.readRaw()
+
+  def startNormal(self, standby=1000, filter=0):
+    # measure continuously, standby ms apart, through an IIR filter with
+    # the given coefficient
+    if standby not in STANDBY or filter not in FILTER:
+      raise ValueError('Unsupported standby time or filter coefficient.')
+    with self.bus.transaction():
+      # config writes can be ignored outside sleep mode
+      self._setMode(MODE_SLEEP)
+      self.bus.write_block(self.addr, REG_CONFIG, [STANDBY[standby]<<5 | FILTER[filter]<<2])
+      self._setMode(MODE_NORMAL)
+    self._due = monotonic() + MEASURE_TIME
+
+  def stop(self):
+    # back to sleep mode, ending normal mode measurements
+    self._setMode(MODE_SLEEP)
+    self._due = None
+
+  def readLatest(self):
+    # read the last completed normal mode measurement, waiting for the
+    # first one after startNormal()
+    if self.mode != MODE_NORMAL:
+      raise ValueError('The sensor is not in normal mode.')
+    self._wait(True)
+    return self.readData()
+
+  def readData(self):
+    # read and compensate the data registers
+    return self.compensate(self.readRaw())
+
+  def compensate(self, data):
+    # turn data registers read from this sensor into temperature (C),
+    # pressure (hPa) and humidity (%)
+    if self.integer:
+      temperature,pressure,humidity = compensateInt(self.calibration, data)
+      return temperature/100.0,pressure/25600.0,humidity/1024.0
+    return compensate(self.calibration, data)
+
+  def readRaw(self):
+    # read the data registers. The sensor keeps them consistent during a
+    # single burst read, even while converting.
+    return self.bus.read_block(self.addr, REG_DATA, 8)
+
+  def readAll(self):
+    if self.mode == MODE_NORMAL:
+      return self.readLatest()
+    self.trigger()
+    return self.collect()
+
+  def _setMode(self, mode):
+    control = OVERSAMPLE_TEMP<<5 | OVERSAMPLE_PRES<<2 | mode
+    self.bus.write_block(self.addr, REG_CONTROL, [control])
+    self.mode = mode
+
+  def _wait(self, wait):
+    # wait for the pending conversion: sleep until it is due, then poll
+    # the status register. Return False instead if wait is False.
+    if self._due is None:
+      return True
+    delay = self._due - monotonic()
+    if delay > 0:
+      if not wait:
+        return False
+      time.sleep(delay)
+    while self.measuring():
+      if not wait:
+        return False
+      if monotonic() > self._due + POLL_TIMEOUT:
+        raise IOError('BME280 measurement did not complete.')
+      time.sleep(POLL_INTERVAL)
+    self._due = None
+    return True
+
 def main():
 
-  (chip_id, chip_version) = readBME280ID()
-  print "Chip ID     :", chip_id
-  print "Version     :", chip_version
+  sensor = BME280()
+  print("Chip ID     :", sensor.chip_id)
+  print("Version     :", sensor.chip_version)
 
-  temperature,pressure,humidity = readBME280All()
+  temperature,pressure,humidity = sensor.readAll()
 
-  print "Temperature : ", temperature, "C"
-  print "Pressure : ", pressure, "hPa"
-  print "Humidity : ", humidity, "%"
+  print("Temperature : ", temperature, "C")
+  print("Pressure : ", pressure, "hPa")
+  print("Humidity : ", humidity, "%")
 
 if __name__=="__main__":
    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/python3
+#--------------------------------------
+#
+#           bme280_aio.py
+#  Read the BME280 from an asyncio event loop (Python 3.5+).
+#
+#  The measurement time is awaited instead of slept, so the loop keeps
+#  running the display and anything else meanwhile.
+#
+#--------------------------------------
+import asyncio
+
+import bme280
+
+async def readBME280All(addr=bme280.DEVICE, bus=None):
+  await asyncio.sleep(bme280.startBME280(addr, bus))
+  return bme280.readBME280Data(addr, bus)
+
+async def readSensor(sensor):
+  # same for a bme280.BME280, without reading the calibration data again
+  await asyncio.sleep(sensor.trigger())
+  while not sensor.ready():
+    await asyncio.sleep(bme280.POLL_INTERVAL)
+  return sensor.collect()
+
+def main():
+
+  loop = asyncio.new_event_loop()
+  try:
+    temperature,pressure,humidity = loop.run_until_complete(readSensor(bme280.BME280()))
+  finally:
+    loop.close()
+
+  print("Temperature : ", temperature, "C")
+  print("Pressure : ", pressure, "hPa")
+  print("Humidity : ", humidity, "%")
+
+if __name__=="__main__":
+   main()
@@ -2,299 +2,216 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division, absolute_import, unicode_literals
 
+import os
 import sys
 import bme280
 
-from RPLCD_i2c import CharLCD
+from history import History
+from sampler import Sampler
+
+from RPLCD_i2c import CharLCD, BigFont, Slide
 from RPLCD_i2c import Alignment, CursorMode, ShiftMode
 from RPLCD_i2c import cursor, cleared
-from time import strftime, sleep
-from datetime import datetime
-
-# build big digits
-def disp_number(lcd_char, position):
-
-    if lcd_char=="0" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(4))
-        lcd.write_string(unichr(0))
-        lcd.write_string(unichr(5))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(7))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(6))
-
-    elif lcd_char=="1" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(0))
-        lcd.write_string(unichr(5))
-        lcd.write_string(unichr(254))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(255))
-        lcd.write_string(unichr(1))
-		
-    elif lcd_char=="2" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(2))
-        lcd.write_string(unichr(2))
-        lcd.write_string(unichr(5))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(255))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(1))
-
-    elif lcd_char=="3" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(0))
-        lcd.write_string(unichr(2))
-        lcd.write_string(unichr(5))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(6))
-
-    elif lcd_char=="4" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(255))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(255))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(6))
-		
-    elif lcd_char=="5" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(255))
-        lcd.write_string(unichr(2))
-        lcd.write_string(unichr(2))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(6))
-		
-    elif lcd_char=="6" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(4))
-        lcd.write_string(unichr(2))
-        lcd.write_string(unichr(2))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(7))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(6))
-		
-    elif lcd_char=="7" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(0))
-        lcd.write_string(unichr(0))
-        lcd.write_string(unichr(5))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(6))
-		
-    elif lcd_char=="8" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(4))
-        lcd.write_string(unichr(2))
-        lcd.write_string(unichr(5))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(7))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(6))
-		
-    elif lcd_char=="9" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(255))
-        lcd.write_string(unichr(2))
-        lcd.write_string(unichr(5))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(1))
-        lcd.write_string(unichr(6))
-     
-    elif lcd_char=="C" :
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(255))
-        lcd.write_string(unichr(2))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(254))
-    
-    else:
-        lcd.cursor_pos = (0, position)
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(254))
-        lcd.cursor_pos = (1, position)
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(254))
-        lcd.write_string(unichr(254))
-    
-    return lcd_char;
-    
-# scroll effect
-def shift(direction): 
-    if direction=="left" :
-        for x in range(0, 16):
-            lcd.shift_display(-1)
-            sleep(0.05)
-    else :
-        for x in range(0, 16):
-            lcd.shift_display(1)
-            sleep(0.05)
-
-def read_temp():
-    temperature,pressure,humidity = bme280.readBME280All()
-    return temperature
-                
-def clock_dots():
-    # display two dots
-    lcd.cursor_pos = (0, 8)
-    lcd.write_string(unichr(3))
-    lcd.cursor_pos = (1, 8)
-    lcd.write_string(unichr(3))
-    sleep(0.5)
-    
-    # remove the two dots
+from time import strftime, localtime, sleep, time
+
+# custom symbols, the big digits load their own
+dot = (0b00000, 0b00000, 0b00000, 0b11000, 0b11000, 0b00000, 0b00000, 0b00000)
+
+# draw the next screen on the hidden page
+def next_page():
+    lcd.page = 1 - lcd.page
+    lcd.cursor_pos = (0, 0)
+    lcd.write_string('                ')
+    lcd.cursor_pos = (1, 0)
+    lcd.write_string('                ')
+
+# scroll effect, only shift commands go out
+def slide_in():
+    Slide(lcd, lcd.page).play(fps=20)
+
+# wake twice a second, on the wall clock half seconds
+TICK = 0.5
+# info screens (date, temperature) every 30 seconds, at :15 and :45
+INFO_EVERY = 30
+INFO_OFFSET = 15
+
+class Scheduler(object):
+    """Call functions on wall clock tick boundaries.
+
+    Ticks are multiples of ``tick`` seconds since the epoch, so with 0.5 the
+    even ones fall on whole seconds. The scheduler sleeps until the next
+    one, functions get its time as a ``time()`` timestamp. Ticks missed
+    while functions were busy are skipped, not caught up on."""
+
+    def __init__(self, tick=TICK):
+        self.tick = tick
+        self._periodic = []
+        self._timers = []
+        self._current = int(time() // tick)
+
+    def every(self, seconds, function, offset=0):
+        """Call ``function`` on every tick at a multiple of ``seconds``, plus
+        ``offset`` seconds."""
+        interval = max(1, int(round(seconds / self.tick)))
+        self._periodic.append((interval, int(round(offset / self.tick)) % interval, function))
+
+    def after(self, seconds, function):
+        """Call ``function`` once, ``seconds`` after the current tick."""
+        self._timers.append((self._current + int(round(seconds / self.tick)), function))
+
+    def run(self):
+        while True:
+            tick = int(time() // self.tick) + 1
+            # sleep() can return a little early
+            delay = tick * self.tick - time()
+            while delay > 0:
+                sleep(delay)
+                delay = tick * self.tick - time()
+            self._current = tick
+            timestamp = tick * self.tick
+            for interval, offset, function in self._periodic:
+                if tick % interval == offset:
+                    function(timestamp)
+            for timer in [timer for timer in self._timers if timer[0] <= tick]:
+                self._timers.remove(timer)
+                timer[1](timestamp)
+
+class TimeStrings(object):
+    """Time and date strings, formatted once per minute and once per day."""
+
+    def __init__(self):
+        self.minute = None
+        self.day = None
+
+    def update(self, timestamp):
+        """Refresh the strings for ``timestamp``, return whether the minute
+        changed."""
+        minute = int(timestamp // 60)
+        if minute == self.minute:
+            return False
+        self.minute = minute
+        now = localtime(timestamp)
+        self.digits = strftime('%H%M', now)
+        self.hour = now.tm_hour
+        if now.tm_yday != self.day:
+            self.day = now.tm_yday
+            self.day_digits = strftime('%d', now)
+            self.month = strftime('%B', now)
+            self.day_name = strftime('%A', now)
+        return True
+
+def clock_dots(visible):
+    # display or remove the two dots
+    char = big.glyphs.char(dot) if visible else ' '
     lcd.cursor_pos = (0, 8)
-    lcd.write_string(unichr(254))
+    lcd.write_string(char)
     lcd.cursor_pos = (1, 8)
-    lcd.write_string(unichr(254))
-    sleep(0.5)
+    lcd.write_string(char)
 
-def clock_date(digits, month, day_name):
-    # previous text leaving to left
-    shift("left")
+def clock_date():
     # preparing date buffer
-    tens_day = disp_number(digits[4], 0)
-    day = disp_number(digits[5], 4)
-    lcd.cursor_pos = (0, 8)
-    lcd.write_string('        ')
-    lcd.cursor_pos = (1, 8)
-    lcd.write_string('        ')
+    next_page()
+    big.render_big(strings.day_digits, 0, 0)
     lcd.cursor_pos = (0, 8)
-    lcd.write_string(month[:8])
+    lcd.write_string(strings.month[:8])
     lcd.cursor_pos = (1, 8)
-    lcd.write_string(day_name[:8])
-    # date entering from left
-    shift("right")
-    sleep(2)
+    lcd.write_string(strings.day_name[:8])
+    # date replacing the previous text
+    slide_in()
 
 
 def clock_temp():
-    # previous text leaving to left
-    shift("left")
     # preparing temp buffer
+    next_page()
     lcd.cursor_pos = (0, 0)
-    lcd.write_string('Temp:           ')
-    lcd.cursor_pos = (1, 0)
-    lcd.write_string('                ')
+    lcd.write_string('Temp:')
 
-    temp_digits = str(read_temp());
-    disp_number(temp_digits[0], 6)
-    disp_number(temp_digits[1], 10)
-    disp_number("C", 14)
+    # last background sample, no bus access here
+    aggregate = sampler.latest()
+    if aggregate is None:
+        temp_digits = '--'
+    else:
+        temp_digits = str(aggregate.temperature.latest)
+        lcd.cursor_pos = (1, 0)
+        lcd.write_string('%d%%' % round(aggregate.humidity.latest))
+    big.render_big(temp_digits[:2] + "C", 0, 6)
     lcd.cursor_pos = (0, 13)
-    lcd.write_string(unichr(223))
-    # date entering from left
-    shift("right")
-    sleep(5)
-
-def clock_hour(digits):
-    # date leaving to left
-    shift("left")
+    lcd.write_string('°')
+    # temp replacing the date
+    slide_in()
+
+def clock_hour():
     # preparing hour buffer
-    lcd.cursor_pos = (0, 0)
-    lcd.write_string('                ')
-    lcd.cursor_pos = (1, 0)
-    lcd.write_string('                ')
-    disp_number(digits[0], 0)
-    disp_number(digits[1], 4)
-    disp_number(digits[2], 9)
-    disp_number(digits[3], 13)
-    # hour entering from left
-    shift("right")
+    next_page()
+    big.render_big(strings.digits[0:2], 0, 0)
+    big.render_big(strings.digits[2:4], 0, 9)
+    # hour replacing the temp
+    slide_in()
+
+
+def on_tick(timestamp):
+    # minute change, and colon blink while the time is shown
+    if strings.update(timestamp):
+        # enable backlight by night
+        lcd.set_backlight(strings.hour>=19 or strings.hour<9)
+        if time_shown:
+            big.render_big(strings.digits[0:2], 0, 0)
+            big.render_big(strings.digits[2:4], 0, 9)
+    if time_shown:
+        # dots on during the first half of each second
+        clock_dots(timestamp % 1 == 0)
+        lcd.flush()
+
+def on_info(timestamp):
+    global time_shown
+    time_shown = False
+    # date display, then temperature after 2s, then back to the hour
+    clock_date()
+    scheduler.after(2, lambda timestamp: clock_temp())
+    scheduler.after(7, on_info_done)
+
+def on_info_done(timestamp):
+    global time_shown
+    clock_hour()
+    time_shown = True
 
 
 def main():
+    global strings, scheduler, time_shown
 
-    try:
-        input = raw_input
-    except NameError:
-        pass
-
-    try:
-        unichr = unichr
-    except NameError:
-        unichr = chr
-
-    old_time = 0
-    counter = 0
-
-    # custom symbols
     lcd.clear()
-    top_line = (0b11111, 0b11111, 0b00000, 0b00000, 0b00000, 0b00000, 0b00000, 0b00000)
-    bottom_line = (0b00000, 0b00000, 0b00000, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111)
-    both_lines = (0b11111, 0b11111, 0b00000, 0b00000, 0b00000, 0b00000, 0b11111, 0b11111)
-    dot = (0b00000, 0b00000, 0b00000, 0b11000, 0b11000, 0b00000, 0b00000, 0b00000)
-    up_left = (0b00111, 0b01111, 0b01111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111)
-    up_right = (0b11100, 0b11110, 0b11110, 0b11111, 0b11111, 0b11111, 0b11111, 0b11111)
-    bot_right = (0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b11110, 0b11110, 0b11100)
-    bot_left = (0b11111, 0b11111, 0b11111, 0b11111, 0b11111, 0b01111, 0b01111, 0b00111)
-
-    lcd.create_char(0, top_line)
-    lcd.create_char(1, bottom_line)
-    lcd.create_char(2, both_lines)
-    lcd.create_char(3, dot)
-    lcd.create_char(4, up_left)
-    lcd.create_char(5, up_right)
-    lcd.create_char(6, bot_right)
-    lcd.create_char(7, bot_left)
+    lcd.flush()
+
+    strings = TimeStrings()
+    time_shown = True
+    scheduler = Scheduler(TICK)
+    scheduler.every(TICK, on_tick)
+    scheduler.every(INFO_EVERY, on_info, INFO_OFFSET)
 
     #main loop
-    while True:
-        counter += 1
-        new_time = datetime.now().strftime('%H%M%d')
-        month = datetime.now().strftime('%B')
-        day_name = datetime.now().strftime('%A')
-
-        # time changed, update LCD buffer
-        if new_time!=old_time :
-            digits = str(new_time)
-            tens_hour = disp_number(digits[0], 0)
-            hour = disp_number(digits[1], 4)
-            tens_minutes = disp_number(digits[2], 9)
-            minutes = disp_number(digits[3], 13)
-            old_time = new_time
-
-            cur_hour = int(tens_hour)*10 + int(hour)
-            # enable backlight by night
-            lcd.set_backlight(cur_hour>=19 or cur_hour<9)
-
-        # dots blink
-        clock_dots()
-        
-        if counter==15 :
-            counter=0
-            # date display
-            clock_date(digits, month, day_name)
-            # temperature display
-            clock_temp()
-            # temperature display
-            clock_hour(digits)
+    scheduler.run()
 
 
 if __name__ == '__main__':
 
-  lcd = CharLCD(address=0x3F, port=1, cols=16, rows=2, dotsize=8)
+  lcd = CharLCD(address=0x3F, port=1, cols=16, rows=2, dotsize=8,
+                threaded=True, charmap='A00')
+  big = BigFont(lcd)
+  # calibration data is read once, the sampler thread then measures every
+  # 10s, keeps the last hour in memory and everything on disk
+  store = History(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history.bin'))
+  sampler = Sampler(bme280.BME280(), interval=10, window=360, store=store)
+  sampler.start()
 
   try:
     main()
   except KeyboardInterrupt:
     pass
   finally:
+    sampler.stop()
+    store.close()
     lcd.clear()
+    lcd.flush()
     lcd.set_backlight(False)
     lcd.home()
+    lcd.close()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Append-only sensor history.
+
+Samples are stored as 10 byte records: a timestamp in whole seconds, the
+temperature in 0.01 C, the pressure in 0.02 hPa and the humidity in 0.01 %.
+Records are grouped in 4 KiB pages, each starting with a header holding
+its record count, a CRC32 and the time span and minimum and maximum values
+of its records. Range queries and downsampling use the headers of the pages
+they cover completely, and only read the records of the others.
+
+Writes are whole pages. The page being filled is kept in memory and saved
+every ``sync_interval`` seconds to a separate ``.tail`` file, replaced
+atomically. Full pages are appended to the main file and synced once. A
+page torn by a power loss fails its CRC check and is dropped when the file
+is opened again, its records still being in the tail file.
+
+Example::
+
+    >>> store = History('history.bin')
+    >>> store.append(time(), 21.37, 1013.25, 45.2)
+    >>> [span.max[0] if span else None for span in store.downsample(day_ago, now, 16)]
+    [19.52, 19.1, ..., 22.3]
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import namedtuple
+from time import time
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+### CONSTANTS ###
+
+PAGE_SIZE = 4096
+MAGIC = b'BMEH'
+VERSION = 1
+
+# Magic, version, record count, page index, CRC32, first and last
+# timestamp, minimum and maximum of each quantity
+HEADER = struct.Struct('<4sHHIIIIhHHhHH')
+# Timestamp, temperature, pressure, humidity
+RECORD = struct.Struct('<IhHH')
+RECORDS_PER_PAGE = (PAGE_SIZE - HEADER.size) // RECORD.size
+
+# Stored units per C, hPa and %
+SCALES = (100, 50, 100)
+LIMITS = ((-32768, 32767), (0, 65535), (0, 65535))
+
+
+### NAMEDTUPLES ###
+
+# Summary of the records in a time range: first and last timestamp, number
+# of records, and (temperature, pressure, humidity) tuples of the minimum
+# and maximum values
+Span = namedtuple('Span', 'first last count min max')
+
+
+### HELPERS ###
+
+def encode(temperature, pressure, humidity):
+    """Return the stored integers of a sample, clamped to their range."""
+    return tuple(min(max(int(round(value * scale)), low), high)
+                 for value, scale, (low, high) in zip((temperature, pressure, humidity),
+                                                      SCALES, LIMITS))
+
+
+def decode(values):
+    """Return the temperature, pressure and humidity of stored integers."""
+    return tuple(value / scale for value, scale in zip(values, SCALES))
+
+
+def page_header(index, records, crc=0):
+    """Return the header fields of page ``index`` holding ``records``."""
+    values = list(zip(*records))[1:]
+    return (MAGIC, VERSION, len(records), index, crc, records[0][0], records[-1][0]) + \
+        tuple(min(column) for column in values) + tuple(max(column) for column in values)
+
+
+def pack_page(index, records):
+    """Return page ``index`` holding ``records``, as bytes."""
+    count = len(records)
+    assert 0 < count <= RECORDS_PER_PAGE, 'A page holds 1 to {0} records.'.format(RECORDS_PER_PAGE)
+    body = struct.pack('<' + 'IhHH' * count, *[field for record in records for field in record])
+    body += b'\0' * (PAGE_SIZE - HEADER.size - len(body))
+    header = page_header(index, records)
+    crc = zlib.crc32(HEADER.pack(*header) + body) & 0xFFFFFFFF
+    return HEADER.pack(*header[:4] + (crc,) + header[5:]) + body
+
+
+def unpack_records(buffer, offset, count):
+    """Return ``count`` records stored at ``offset`` of ``buffer``."""
+    fields = struct.unpack_from('<' + 'IhHH' * count, buffer, offset)
+    return [fields[i:i + 4] for i in range(0, len(fields), 4)]
+
+
+def check_page(page, index):
+    """Return whether ``page`` is a valid page number ``index``."""
+    if len(page) != PAGE_SIZE:
+        return False
+    header = HEADER.unpack_from(page)
+    if header[0] != MAGIC or header[2] > RECORDS_PER_PAGE or header[3] != index:
+        return False
+    blank = HEADER.pack(*header[:4] + (0,) + header[5:])
+    return zlib.crc32(blank + page[HEADER.size:]) & 0xFFFFFFFF == header[4]
+
+
+class _Summary(object):
+    """Running minimum and maximum of stored records."""
+
+    def __init__(self):
+        self.first = self.last = None
+        self.count = 0
+        self.min = self.max = None
+
+    def merge(self, first, last, count, low, high):
+        if self.count == 0:
+            self.first, self.min, self.max = first, low, high
+        else:
+            self.min = tuple(min(a, b) for a, b in zip(self.min, low))
+            self.max = tuple(max(a, b) for a, b in zip(self.max, high))
+        self.last = last
+        self.count += count
+
+    def add(self, record):
+        self.merge(record[0], record[0], 1, record[1:], record[1:])
+
+    def span(self):
+        if self.count == 0:
+            return None
+        return Span(self.first, self.last, self.count, decode(self.min), decode(self.max))
+
+
+### MAIN ###
+
+class History(object):
+
+    def __init__(self, path, sync_interval=600):
+        """
+        Open or create a history file.
+
+        Args:
+            path:
+                The history file. The page being filled is saved next to
+                it, with a ``.tail`` suffix.
+            sync_interval:
+                Seconds between saves of the page being filled, the most
+                history a power loss can take. Default: 600, that is one
+                4 KiB write every 10 minutes, and one when a page is full.
+
+        """
+        self.path = path
+        self.sync_interval = sync_interval
+        # Samples are usually appended and read from different threads
+        self._lock = threading.RLock()
+        self._tail_path = path + '.tail'
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._map = None
+        self.pages = os.fstat(self._fd).st_size // PAGE_SIZE
+        # A page torn by a power loss is the last one
+        if self.pages and not check_page(self._read_page(self.pages - 1), self.pages - 1):
+            self.pages -= 1
+        os.ftruncate(self._fd, self.pages * PAGE_SIZE)
+        self._records = self._load_tail()
+        self._synced = time()
+
+    def _read_page(self, index):
+        os.lseek(self._fd, index * PAGE_SIZE, os.SEEK_SET)
+        return os.read(self._fd, PAGE_SIZE)
+
+    def _load_tail(self):
+        """Return the records of the saved tail page, if it follows the
+        last page of the file."""
+        try:
+            with open(self._tail_path, 'rb') as f:
+                page = f.read()
+        except IOError:
+            return []
+        if not check_page(page, self.pages):
+            return []
+        return unpack_records(page, HEADER.size, HEADER.unpack_from(page)[2])
+
+    def __len__(self):
+        with self._lock:
+            return self.pages * RECORDS_PER_PAGE + len(self._records)
+
+    def append(self, timestamp, temperature, pressure, humidity):
+        """Store a sample.
+
+        Raises:
+            ValueError:
+                Raised when ``timestamp`` is older than the last sample.
+
+        """
+        timestamp = int(timestamp)
+        with self._lock:
+            last = self._records[-1][0] if self._records else self._last_stored()
+            if last is not None and timestamp < last:
+                raise ValueError('Samples must be appended in time order.')
+            self._records.append((timestamp,) + encode(temperature, pressure, humidity))
+            # More after a failed page write, retried with each sample
+            if len(self._records) >= RECORDS_PER_PAGE:
+                self._write_page()
+            elif time() - self._synced >= self.sync_interval:
+                self.sync()
+
+    def _last_stored(self):
+        if not self.pages:
+            return None
+        return self._header(self.pages - 1)[6]
+
+    def _write_page(self):
+        """Append the full page to the file. The tail file becomes stale,
+        so it does not need to be rewritten. The records stay in memory
+        until the page is synced, a failed write leaves the file as it was
+        once opened again."""
+        os.lseek(self._fd, self.pages * PAGE_SIZE, os.SEEK_SET)
+        os.write(self._fd, pack_page(self.pages, self._records[:RECORDS_PER_PAGE]))
+        os.fsync(self._fd)
+        self.pages += 1
+        self._records = self._records[RECORDS_PER_PAGE:]
+        self._synced = time()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def sync(self):
+        """Save the page being filled."""
+        with self._lock:
+            self._synced = time()
+            if not self._records:
+                return
+            tmp = self._tail_path + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(pack_page(self.pages, self._records[:RECORDS_PER_PAGE]))
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp, self._tail_path)
+
+    def close(self):
+        """Save the page being filled and close the file."""
+        with self._lock:
+            self.sync()
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            os.close(self._fd)
+
+    ### READING ###
+
+    def _buffer(self):
+        """The stored pages, memory mapped."""
+        if self._map is None:
+            self._map = mmap.mmap(self._fd, self.pages * PAGE_SIZE, access=mmap.ACCESS_READ)
+        return self._map
+
+    def _header(self, index):
+        return HEADER.unpack_from(self._buffer(), index * PAGE_SIZE)
+
+    def _first_page(self, start):
+        """Index of the first page with records at or after ``start``."""
+        low, high = 0, self.pages
+        while low < high:
+            middle = (low + high) // 2
+            if self._header(middle)[6] < start:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _pages(self, start, end):
+        """Yield ``(header, records)`` of the pages with records in
+        ``[start, end)``, the page being filled last. ``records`` is a
+        function reading them."""
+        if self.pages:
+            buffer = self._buffer()
+            for index in range(self._first_page(start), self.pages):
+                header = self._header(index)
+                if header[5] >= end:
+                    return
+                offset = index * PAGE_SIZE + HEADER.size
+                yield header, lambda offset=offset, count=header[2]: \
+                    unpack_records(buffer, offset, count)
+        records = self._records
+        if records and records[0][0] < end and records[-1][0] >= start:
+            yield page_header(self.pages, records), lambda: records
+
+    def records(self, start=0, end=2 ** 32):
+        """Return the ``(timestamp, temperature, pressure, humidity)``
+        samples taken in ``[start, end)``, oldest first."""
+        with self._lock:
+            return [(record[0],) + decode(record[1:])
+                    for header, records in self._pages(start, end)
+                    for record in records() if start <= record[0] < end]
+
+    def span(self, start=0, end=2 ** 32):
+        """Return the :class:`Span` of the samples taken in ``[start, end)``,
+        None if there are none."""
+        return self.downsample(start, end, 1)[0]
+
+    def downsample(self, start, end, buckets):
+        """Split ``[start, end)`` in ``buckets`` equal parts, return the
+        :class:`Span` of each part, None for those without samples.
+
+        Pages within a single part are summed up from their header, only
+        pages across a boundary have their records read.
+
+        """
+        assert end > start and buckets > 0, 'Expected a time range and a bucket count.'
+        width = (end - start) / buckets
+        summaries = [_Summary() for bucket in range(buckets)]
+        with self._lock:
+            for header, records in self._pages(start, end):
+                first, last = header[5], header[6]
+                bucket = int((first - start) // width)
+                if first >= start and last < end and bucket == int((last - start) // width):
+                    summaries[bucket].merge(first, last, header[2], header[7:10], header[10:13])
+                    continue
+                for record in records():
+                    if start <= record[0] < end:
+                        summaries[min(int((record[0] - start) // width), buckets - 1)].add(record)
+        return [summary.span() for summary in summaries]
+
+    def verify(self):
+        """Return the indexes of the stored pages failing their CRC check."""
+        with self._lock:
+            buffer = self._buffer() if self.pages else b''
+            return [index for index in range(self.pages)
+                    if not check_page(buffer[index * PAGE_SIZE:(index + 1) * PAGE_SIZE], index)]
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Background BME280 sampling.
+
+A :class:`Sampler` measures one or more sensors at a fixed rate from its own
+thread. Each sample is kept in fixed size ring buffers, both as the 8 raw
+data registers and compensated, and rolling statistics over the buffered
+samples are updated as samples come and go. After each round the thread
+publishes an :class:`Aggregate` per sensor, which display code reads
+without touching the bus or taking a lock.
+
+Example::
+
+    >>> sampler = Sampler(bme280.BME280(), interval=10, window=360)
+    >>> sampler.start()
+    >>> aggregate = sampler.latest()
+    >>> aggregate.temperature.latest, aggregate.pressure.trend * 3600
+    (21.37, -0.42)
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import threading
+import time
+from array import array
+from collections import deque, namedtuple
+
+import bme280
+
+### PYTHON 3 COMPAT ###
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+try:
+    monotonic = time.monotonic
+except AttributeError:  # Python 2
+    monotonic = time.time
+
+
+### NAMEDTUPLES ###
+
+# Rolling statistics of one quantity over the buffered samples. The trend
+# is the least squares slope, in units per second.
+Stats = namedtuple('Stats', 'latest mean min max trend')
+
+# What is known about a sensor after its last sample: when it was taken,
+# how many samples are buffered, how many reads and writes to the store
+# failed so far, and the statistics of each quantity
+Aggregate = namedtuple('Aggregate', 'time count errors temperature pressure humidity')
+
+QUANTITIES = ('temperature', 'pressure', 'humidity')
+
+
+### HELPERS ###
+
+class RingBuffer(object):
+    """The last ``size`` records of ``width`` numbers each, stored back to
+    back in a single array of ``typecode`` items.
+
+    Index 0 is the oldest record, -1 the newest."""
+
+    def __init__(self, size, width=1, typecode='d'):
+        assert size > 0, 'The buffer size must be positive.'
+        self.size = size
+        self.width = width
+        self.data = array(typecode, [0]) * (size * width)
+        # records appended so far, buffered or not
+        self.appended = 0
+
+    def __len__(self):
+        return min(self.appended, self.size)
+
+    def __getitem__(self, index):
+        count = len(self)
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('Ring buffer index out of range.')
+        start = (self.appended - count + index) % self.size * self.width
+        return tuple(self.data[start:start + self.width])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def append(self, record):
+        """Append a record, return the one it overwrote, or None while the
+        buffer is not full."""
+        evicted = self[0] if self.appended >= self.size else None
+        start = self.appended % self.size * self.width
+        self.data[start:start + self.width] = array(self.data.typecode, record)
+        self.appended += 1
+        return evicted
+
+
+class Rolling(object):
+    """Mean, minimum, maximum and trend of a sliding window of values, each
+    value added and removed in amortized constant time.
+
+    The mean and the trend come from running sums. Times are taken relative
+    to an origin that :meth:`rebase` moves, so the sums stay small. The
+    minimum and the maximum are the heads of two monotonic queues."""
+
+    def __init__(self):
+        self._min = deque()
+        self._max = deque()
+        self.rebase(0, [])
+
+    def rebase(self, origin, samples):
+        """Recompute the sums from ``(time, value)`` pairs, with times
+        relative to ``origin``. Done once in a while, so that rounding
+        errors do not pile up."""
+        self._origin = origin
+        self.count = 0
+        self._sx = self._sy = self._sxx = self._sxy = 0.0
+        for t, value in samples:
+            self._update(t, value, 1)
+
+    def _update(self, t, value, sign):
+        x = t - self._origin
+        self.count += sign
+        self._sx += sign * x
+        self._sy += sign * value
+        self._sxx += sign * x * x
+        self._sxy += sign * x * value
+
+    def add(self, seq, t, value):
+        """Add ``value`` measured at time ``t``, ``seq`` numbering the values
+        in order."""
+        if self.count == 0:
+            # Times relative to the epoch would swamp the sums
+            self._origin = t
+        self._update(t, value, 1)
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seq, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seq, value))
+
+    def remove(self, seq, t, value):
+        """Remove the oldest value, as passed to :meth:`add`."""
+        self._update(t, value, -1)
+        if self._min[0][0] == seq:
+            self._min.popleft()
+        if self._max[0][0] == seq:
+            self._max.popleft()
+
+    def stats(self, latest):
+        count = self.count
+        denominator = count * self._sxx - self._sx * self._sx
+        if count > 1 and denominator > 0:
+            trend = (count * self._sxy - self._sx * self._sy) / denominator
+        else:
+            trend = 0.0
+        return Stats(latest, self._sy / count, self._min[0][1], self._max[0][1], trend)
+
+
+class Channel(object):
+    """Buffers and statistics of one sensor."""
+
+    def __init__(self, sensor, window, store=None):
+        self.sensor = sensor
+        self.store = store
+        self.times = RingBuffer(window)
+        self.raw = RingBuffer(window, 8, 'B')
+        self.values = RingBuffer(window, len(QUANTITIES))
+        self.rolling = [Rolling() for quantity in QUANTITIES]
+        self.errors = 0
+        self.aggregate = None
+
+    def add(self, t, data):
+        """Buffer a sample taken at time ``t`` from the raw data registers,
+        return its :class:`Aggregate`."""
+        values = self.sensor.compensate(data)
+        seq = self.times.appended
+        evicted = self.times.append((t,))
+        evicted_values = self.values.append(values)
+        self.raw.append(bytearray(data))
+        for i, rolling in enumerate(self.rolling):
+            if evicted is not None:
+                rolling.remove(seq - self.times.size, evicted[0], evicted_values[i])
+            rolling.add(seq, t, values[i])
+        # A full turn of the buffer since the last rebase
+        if seq % self.times.size == self.times.size - 1:
+            samples = list(zip(self.times, self.values))
+            for i, rolling in enumerate(self.rolling):
+                rolling.rebase(samples[0][0][0], [(when[0], v[i]) for when, v in samples])
+        stats = [rolling.stats(value) for rolling, value in zip(self.rolling, values)]
+        self.aggregate = Aggregate(t, len(self.times), self.errors, *stats)
+        return self.aggregate
+
+    def error(self):
+        """Count a failed read or store, and publish the count."""
+        self.errors += 1
+        if self.aggregate is not None:
+            self.aggregate = self.aggregate._replace(errors=self.errors)
+
+
+### MAIN ###
+
+class Sampler(object):
+
+    def __init__(self, sensors, interval=10, window=360, store=None):
+        """
+        Sample BME280 sensors in a background thread.
+
+        Args:
+            sensors:
+                A :class:`bme280.BME280`, or a dict mapping names to them.
+            interval:
+                Seconds between samples. Default: 10.
+            window:
+                Number of samples buffered per sensor, and covered by the
+                statistics. Default: 360, an hour at the default interval.
+            store:
+                A :class:`history.History` keeping every sample on disk,
+                or a dict mapping sensor names to them. Default: None.
+
+        """
+        assert interval > 0, 'The interval must be positive.'
+        if not hasattr(sensors, 'items'):
+            sensors = {None: sensors}
+            store = {None: store}
+        elif store is None:
+            store = {}
+        self.interval = interval
+        self.channels = dict((name, Channel(sensor, window, store.get(name)))
+                             for name, sensor in sensors.items())
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the sampling thread."""
+        assert self._thread is None, 'The sampler is already running.'
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='bme280-sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the sampling thread, once its current round is done."""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def latest(self, name=None):
+        """Return the last :class:`Aggregate` of a sensor, None before its
+        first sample. Does not block."""
+        return self.channels[name].aggregate
+
+    def history(self, name=None):
+        """Return the buffered samples of a sensor, oldest first, as
+        ``(time, temperature, pressure, humidity)`` tuples."""
+        channel = self.channels[name]
+        with self._lock:
+            return [t + values for t, values in zip(channel.times, channel.values)]
+
+    def raw(self, name=None):
+        """Return the buffered samples of a sensor, oldest first, as
+        ``(time, data)`` tuples of the 8 uncompensated data registers."""
+        channel = self.channels[name]
+        with self._lock:
+            return [(t[0], bytes(bytearray(data))) for t, data in zip(channel.times, channel.raw)]
+
+    def sample(self):
+        """Measure every sensor once. The forced mode conversions run at
+        the same time."""
+        channels = list(self.channels.values())
+        for channel in channels:
+            if channel.sensor.mode != bme280.MODE_NORMAL:
+                try:
+                    channel.sensor.trigger()
+                except IOError:
+                    pass
+        for channel in channels:
+            try:
+                data = channel.sensor.collectRaw()
+            except (IOError, ValueError):
+                # bus error, or the trigger itself failed
+                channel.error()
+                continue
+            t = time.time()
+            with self._lock:
+                aggregate = channel.add(t, data)
+            if channel.store is not None:
+                try:
+                    channel.store.append(t, aggregate.temperature.latest,
+                                         aggregate.pressure.latest, aggregate.humidity.latest)
+                except ValueError:
+                    pass  # the system clock was set back
+                except (IOError, OSError):
+                    # full or failing storage, sampling goes on
+                    channel.error()
+
+    def _run(self):
+        deadline = monotonic()
+        while not self._stopped.is_set():
+            self.sample()
+            deadline += self.interval
+            delay = deadline - monotonic()
+            if delay < 0:
+                # Fell behind, skip the missed samples
+                deadline -= delay
+                delay = 0
+            self._stopped.wait(delay)
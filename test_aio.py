@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+AsyncCharLCD on the HD44780 emulator (Python 3.5+). Works as a plain script
+or under pytest.
+
+"""
+import asyncio
+
+from RPLCD_i2c import AsyncCharLCD
+from RPLCD_i2c.emulator import HD44780Emulator
+
+
+def run(coroutine):
+    """Run a test coroutine on an event loop of its own."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def display():
+    emulator = HD44780Emulator(2, 16)
+    lcd = await AsyncCharLCD.create(0x27, cols=16, rows=2, bus=emulator)
+    return lcd, emulator
+
+
+async def write_string():
+    lcd, emulator = await display()
+    await lcd.write_string('Hello')
+    assert emulator.lines() == ['Hello'.ljust(16), ' ' * 16]
+    assert emulator.violations == []
+
+
+async def backlight_after_queued_commands():
+    # The cursor move is queued with the backlight on, switching it off
+    # has to come after it
+    lcd, emulator = await display()
+    lcd.cursor_pos = (1, 2)
+    await lcd.set_backlight(False)
+    assert not emulator.backlight
+    await lcd.write_string('dark')
+    assert not emulator.backlight
+    assert emulator.lines() == [' ' * 16, '  dark'.ljust(16)]
+    await lcd.set_backlight(True)
+    assert emulator.backlight
+    assert emulator.violations == []
+
+
+def test_write_string():
+    run(write_string())
+
+
+def test_backlight_after_queued_commands():
+    run(backlight_after_queued_commands())
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Cross-check the integer BME280 compensation against the float one.
+
+Runs without a sensor, on random data registers giving readings within the
+sensor's operating range (-40 to 85 C, 300 to 1100 hPa). Works as a plain
+script or under pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import random
+import struct
+import time
+from unittest import SkipTest
+
+import bme280
+from RPLCD_i2c import FakeBus
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+# Datasheet example values, and a second typical set
+CALIBRATIONS = [
+    bme280.Calibration(27504, 26435, -1000, 36477, -10685, 3024, 2855, 140, -7, 15500,
+                       -14600, 6000, 75, 364, 0, 312, 50, 30),
+    bme280.Calibration(28485, 26735, 50, 39122, -10750, 3024, 5899, -140, -7, 15500,
+                       -14600, 6000, 75, 353, 0, 340, 0, 30),
+]
+
+# Largest differences allowed between the two paths: the integer pressure
+# has a resolution of 1/256 Pa, the humidity one of 1/1024 %
+PRESSURE_TOLERANCE = 0.001  # hPa
+HUMIDITY_TOLERANCE = 0.02  # %
+
+
+def registers(pressure, temperature, humidity):
+    """The 8 data registers holding the given ADC values."""
+    return [pressure >> 12, pressure >> 4 & 0xFF, (pressure & 0xF) << 4,
+            temperature >> 12, temperature >> 4 & 0xFF, (temperature & 0xF) << 4,
+            humidity >> 8, humidity & 0xFF]
+
+
+def samples(cal, count=5000, seed=0):
+    """``count`` data registers with in-range float readings."""
+    rng = random.Random(seed)
+    found = 0
+    while found < count:
+        data = registers(rng.randrange(1 << 20), rng.randrange(1 << 20), rng.randrange(1 << 16))
+        temperature, pressure, humidity = bme280.compensate(cal, data)
+        if -40 <= temperature <= 85 and 300 <= pressure <= 1100:
+            found += 1
+            yield data
+
+
+def test_temperature_identical():
+    for cal in CALIBRATIONS:
+        for data in samples(cal):
+            assert bme280.compensateInt(cal, data)[0] / 100 == bme280.compensate(cal, data)[0]
+
+
+def test_pressure_and_humidity_close():
+    for cal in CALIBRATIONS:
+        for data in samples(cal):
+            temperature, pressure, humidity = bme280.compensateInt(cal, data)
+            expected = bme280.compensate(cal, data)
+            assert abs(pressure / 25600 - expected[1]) <= PRESSURE_TOLERANCE, data
+            assert abs(humidity / 1024 - expected[2]) <= HUMIDITY_TOLERANCE, data
+            assert 0 <= humidity <= 100 * 1024
+
+
+def sensor_bus():
+    """A bus with a sensor holding the first calibration."""
+    bus = FakeBus()
+    regs = bus._registers(bme280.DEVICE)
+    regs[0x88:0x88 + 24] = bytearray(struct.pack('<HhhHhhhhhhhh', *CALIBRATIONS[0][:12]))
+    regs[0xA1] = 75
+    regs[0xE1:0xE1 + 7] = bytearray([0x6c, 0x01, 0x00, 0x13, 0x28, 0x03, 0x1e])
+    regs[0xF7:0xFF] = bytearray([0x65, 0x5a, 0xc0, 0x7e, 0xed, 0x00, 0x6a, 0x90])
+    return bus
+
+
+def test_integer_sensor():
+    bus = sensor_bus()
+    float_sensor = bme280.BME280(bus=bus)
+    integer_sensor = bme280.BME280(bus=bus, integer=True)
+    assert float_sensor.calibration == integer_sensor.calibration == CALIBRATIONS[0]
+    expected = float_sensor.readData()
+    temperature, pressure, humidity = integer_sensor.readData()
+    assert temperature == expected[0]
+    assert abs(pressure - expected[1]) <= PRESSURE_TOLERANCE
+    assert abs(humidity - expected[2]) <= HUMIDITY_TOLERANCE
+
+
+def test_wall_clock_step():
+    # NTP stepping the clock at boot must neither stall a measurement nor
+    # time it out
+    sensor = bme280.BME280(bus=sensor_bus())
+    wall, sleep = time.time, time.sleep
+    delays = []
+    for step in (-86400, 86400):
+        sensor.trigger()
+        time.time = lambda: wall() + step
+        time.sleep = delays.append
+        try:
+            assert sensor.collect() == sensor.readData()
+        finally:
+            time.time, time.sleep = wall, sleep
+    assert all(delay <= bme280.MEASURE_TIME for delay in delays)
+
+
+def needs_numpy():
+    if numpy is None:
+        raise SkipTest('numpy is not installed')
+
+
+def test_batch_bit_exact():
+    needs_numpy()
+    rng = random.Random(1)
+    for cal in CALIBRATIONS:
+        # In-range samples, and arbitrary register contents
+        data = list(samples(cal, 2000)) + [[rng.randrange(256) for i in range(8)]
+                                           for sample in range(2000)]
+        batch = bme280.compensateBatch(numpy.array(data, dtype=numpy.uint8), cal)
+        scalar = numpy.array([bme280.compensate(cal, row) for row in data], dtype=numpy.float64)
+        assert (batch.view(numpy.uint64) == scalar.view(numpy.uint64)).all()
+
+
+def test_batch_integer():
+    needs_numpy()
+    for cal in CALIBRATIONS:
+        data = list(samples(cal))
+        batch = bme280.compensateBatchInt(numpy.array(data, dtype=numpy.uint8), cal)
+        assert batch.tolist() == [list(bme280.compensateInt(cal, row)) for row in data]
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            try:
+                test()
+            except SkipTest as e:
+                print(name, 'skipped:', e)
+            else:
+                print(name, 'OK')
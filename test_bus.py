@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Sharing a bus between displays. Works as a plain script or under pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from RPLCD_i2c import CharLCD, FakeBus
+from RPLCD_i2c import bus as buses
+
+
+class ClosingBus(FakeBus):
+    """Fake adapter counting how often it was closed."""
+
+    def __init__(self, port):
+        super(ClosingBus, self).__init__()
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+
+def test_displays_release_shared_bus():
+    port = 42
+    # Open the pooled adapter with the fake transport, then give this
+    # reference back: the displays below take it from the pool
+    shared = buses.shared_bus(port, transport=ClosingBus)
+    adapter = shared.transport
+    first = CharLCD(0x27, port=port)
+    second = CharLCD(0x3F, port=port)
+    shared.close()
+    assert first.bus is second.bus is shared
+    assert shared.users == 2
+
+    first.close()
+    first.close()
+    assert adapter.closed == 0
+    assert shared.users == 1
+    second.close()
+    assert adapter.closed == 1
+    assert port not in buses._pool
+
+
+def test_extra_close_ignored():
+    port = 43
+    old = buses.shared_bus(port, transport=ClosingBus)
+    old.close()
+    old.close()
+    assert old.users == 0
+    assert old.transport.closed == 1
+    # A stale handle closed again leaves the reopened port alone
+    new = buses.shared_bus(port, transport=ClosingBus)
+    old.close()
+    assert buses._pool[port] is new
+    assert new.users == 1 and new.transport.closed == 0
+    assert buses.shared_bus(port) is new
+    new.close()
+    new.close()
+    assert port not in buses._pool
+    assert new.transport.closed == 1
+
+
+def test_display_keeps_given_bus():
+    bus = ClosingBus(None)
+    lcd = CharLCD(0x27, bus=bus)
+    lcd.close()
+    assert bus.closed == 0
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Drive CharLCD through the HD44780 emulator.
+
+Checks what ends up on the display, and that no instruction reaches the
+controller before the previous one has finished. Works as a plain script
+or under pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import warnings
+
+from RPLCD_i2c import Alignment, CharLCD, ShiftMode
+from RPLCD_i2c.lcd import LCD_ENTRYLEFT, LCD_ENTRYRIGHT, LCD_ENTRYSHIFTINCREMENT
+from RPLCD_i2c.emulator import HD44780Emulator
+
+
+BELL = (0b00100, 0b01110, 0b01110, 0b01110, 0b11111, 0b00000, 0b00100, 0b00000)
+
+
+def display(rows=2, cols=16, rw_grounded=False, **kwargs):
+    """Return a CharLCD on a fresh emulator, and the emulator."""
+    emulator = HD44780Emulator(rows, cols, rw_grounded=rw_grounded)
+    lcd = CharLCD(0x27, cols=cols, rows=rows, bus=emulator, **kwargs)
+    return lcd, emulator
+
+
+def test_write_string():
+    lcd, emulator = display()
+    lcd.write_string('Hello world!')
+    lcd.cursor_pos = (1, 3)
+    lcd.write_string('second')
+    assert emulator.lines() == ['Hello world!    ', '   second       ']
+    assert lcd.cursor_pos == (1, 9)
+    assert emulator.violations == []
+
+
+def test_write_string_wraps_and_breaks_lines():
+    lcd, emulator = display(rows=4, cols=20)
+    lcd.write_string('one\r\ntwo')
+    lcd.cursor_pos = (2, 15)
+    lcd.write_string('wrapping')
+    assert emulator.lines() == ['one'.ljust(20), 'two'.ljust(20),
+                                '               wrapp', 'ing'.ljust(20)]
+    assert emulator.violations == []
+
+
+def test_clear_and_home():
+    lcd, emulator = display()
+    lcd.write_string('Some text')
+    lcd.clear()
+    assert emulator.lines() == [' ' * 16] * 2
+    lcd.write_string('abc')
+    lcd.home()
+    lcd.write_string('X')
+    assert emulator.lines() == ['Xbc'.ljust(16), ' ' * 16]
+    assert emulator.violations == []
+
+
+def test_create_char():
+    lcd, emulator = display()
+    lcd.create_char(2, BELL)
+    lcd.write_string('a\x02b')
+    assert emulator.glyph(2) == BELL
+    assert emulator.lines()[0] == 'a\x02b'.ljust(16)
+    assert emulator.violations == []
+
+
+def test_framebuffer_flush():
+    lcd, emulator = display(framebuffer=True)
+    lcd.write_string('Buffered')
+    assert emulator.lines() == [' ' * 16] * 2
+    lcd.flush()
+    assert emulator.lines() == ['Buffered'.ljust(16), ' ' * 16]
+    lcd.cursor_pos = (1, 0)
+    lcd.write_string('next frame')
+    lcd.cursor_pos = (0, 0)
+    lcd.write_string('Changed')
+    lcd.flush()
+    assert emulator.lines() == ['Changedd'.ljust(16), 'next frame'.ljust(16)]
+    assert emulator.violations == []
+
+
+def test_framebuffer_flush_right_to_left():
+    lcd, emulator = display(framebuffer=True)
+    lcd.text_align_mode = Alignment.right
+    lcd.cursor_pos = (0, 15)
+    lcd.write_string('olleH')
+    lcd.flush()
+    assert emulator.lines() == ['Hello'.rjust(16), ' ' * 16]
+    assert emulator.entry_mode == LCD_ENTRYRIGHT
+    # Nothing changed, not even the entry mode is switched
+    sent = emulator.instructions
+    lcd.flush()
+    assert emulator.instructions == sent
+    assert emulator.violations == []
+
+
+def test_framebuffer_flush_display_shift():
+    lcd, emulator = display(framebuffer=True)
+    lcd.write_shift_mode = ShiftMode.display
+    lcd.write_string('Still')
+    lcd.flush()
+    assert emulator.lines() == ['Still'.ljust(16), ' ' * 16]
+    assert emulator.shift == 0
+    assert emulator.entry_mode == LCD_ENTRYLEFT | LCD_ENTRYSHIFTINCREMENT
+    sent = emulator.instructions
+    lcd.flush()
+    assert emulator.instructions == sent
+    assert emulator.violations == []
+
+
+def test_flush_without_warnings():
+    lcd, emulator = display(framebuffer=True)
+    lcd.write_string('quiet')
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        lcd.flush()
+    assert caught == []
+
+
+def test_busy_flag_rw_wired():
+    lcd, emulator = display(busy_flag=True)
+    assert lcd._busy_flag
+    lcd.create_char(0, BELL)
+    lcd.write_string('Busy flag\x00')
+    lcd.clear()
+    lcd.write_string('polled')
+    assert emulator.lines() == ['polled'.ljust(16), ' ' * 16]
+    assert emulator.glyph(0) == BELL
+    assert emulator.violations == []
+
+
+def test_busy_flag_rw_grounded():
+    # The driver has to notice and fall back to timed delays
+    lcd, emulator = display(rw_grounded=True, busy_flag=True)
+    assert not lcd._busy_flag
+    lcd.write_string('Busy flag')
+    lcd.clear()
+    lcd.home()
+    lcd.write_string('timed')
+    assert emulator.lines() == ['timed'.ljust(16), ' ' * 16]
+    assert emulator.violations == []
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')
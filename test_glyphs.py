@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+CGRAM slot allocation by GlyphManager, on the HD44780 emulator. Works as a
+plain script or under pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from RPLCD_i2c import CharLCD, GlyphManager
+from RPLCD_i2c.emulator import HD44780Emulator
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+def bitmap(n):
+    """A distinct 8 row bitmap for each ``n`` below 32."""
+    return (n, 0, n, 0, n, 0, n, 0)
+
+
+def display(**kwargs):
+    """Return a glyph manager on a fresh emulated display, and the emulator."""
+    emulator = HD44780Emulator(2, 16)
+    lcd = CharLCD(0x27, cols=16, rows=2, bus=emulator, **kwargs)
+    return GlyphManager(lcd), emulator
+
+
+def test_same_bitmap_same_slot():
+    glyphs, emulator = display()
+    location = glyphs.slot(bitmap(1))
+    assert glyphs.slot(bitmap(1)) == location
+    # Only the 5 pixel columns count
+    assert glyphs.slot([row | 0xE0 for row in bitmap(1)]) == location
+    assert glyphs.uploads == 1
+    assert emulator.glyph(location) == bitmap(1)
+    glyphs.lcd.write_string(glyphs.char(bitmap(2)))
+    assert glyphs.uploads == 2
+    assert emulator.lines()[0][0] == chr(glyphs.slot(bitmap(2)))
+    assert emulator.violations == []
+
+
+def test_least_recently_used_evicted():
+    glyphs, emulator = display()
+    locations = [glyphs.slot(bitmap(n)) for n in range(8)]
+    assert sorted(locations) == list(range(8))
+    # The first one used again, the second is now the oldest
+    glyphs.slot(bitmap(0))
+    location = glyphs.slot(bitmap(8))
+    assert location == locations[1]
+    assert emulator.glyph(location) == bitmap(8)
+    assert glyphs.slot(bitmap(0)) == locations[0]
+    assert glyphs.uploads == 9
+    # Evicted, so uploaded again
+    glyphs.slot(bitmap(1))
+    assert glyphs.uploads == 10
+    assert emulator.violations == []
+
+
+def test_slots_on_display_kept():
+    # The glyphs on the display are the least recently used ones
+    glyphs, emulator = display()
+    first = glyphs.slot(bitmap(0))
+    glyphs.lcd.write(first)
+    # Codes 8-15 show the glyphs of 0-7
+    mirrored = glyphs.slot(bitmap(1))
+    glyphs.lcd.write(mirrored + 8)
+    others = [glyphs.slot(bitmap(n)) for n in range(2, 8)]
+    assert glyphs.slot(bitmap(8)) == others[0]
+    assert emulator.glyph(first) == bitmap(0)
+    assert emulator.glyph(mirrored) == bitmap(1)
+    assert emulator.violations == []
+
+
+def test_slots_pending_in_framebuffer_kept():
+    glyphs, emulator = display(framebuffer=True)
+    first = glyphs.slot(bitmap(0))
+    glyphs.lcd.write(first)
+    others = [glyphs.slot(bitmap(n)) for n in range(1, 8)]
+    assert emulator.lines()[0][0] == ' '
+    assert glyphs.slot(bitmap(8)) == others[0]
+    glyphs.lcd.flush()
+    assert emulator.lines()[0][0] == chr(first)
+    assert emulator.glyph(first) == bitmap(0)
+    assert emulator.violations == []
+
+
+def test_all_slots_on_display():
+    glyphs, emulator = display()
+    glyphs.lcd.write_string(''.join(glyphs.char(bitmap(n)) for n in range(8)))
+    try:
+        glyphs.slot(bitmap(8))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('A glyph on the display was evicted.')
+    # Loaded bitmaps are still handed out
+    assert glyphs.slot(bitmap(3)) == 3
+    glyphs.lcd.clear()
+    glyphs.slot(bitmap(8))
+    assert glyphs.uploads == 9
+    assert emulator.violations == []
+
+
+def test_fewer_slots():
+    emulator = HD44780Emulator(2, 16)
+    lcd = CharLCD(0x27, cols=16, rows=2, bus=emulator)
+    glyphs = GlyphManager(lcd, slots=3)
+    assert set(glyphs.slot(bitmap(n)) for n in range(10)) == set(range(3))
+    assert glyphs.uploads == 10
+    assert emulator.violations == []
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')
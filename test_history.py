@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+The append-only history store. Works as a plain script or under pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import os
+import random
+import shutil
+import tempfile
+
+import history
+from history import History, PAGE_SIZE, RECORDS_PER_PAGE
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+START = 1700000000
+
+
+def fill(store, count, start=START, seed=0):
+    """Append ``count`` random samples, return them as stored."""
+    rng = random.Random(seed)
+    stored = []
+    for i in range(count):
+        t = start + 10 * i
+        values = (rng.uniform(-10, 40), rng.uniform(950, 1050), rng.uniform(0, 100))
+        store.append(t, *values)
+        stored.append((t,) + history.decode(history.encode(*values)))
+    return stored
+
+
+class Directory(object):
+    """Temporary directory holding a history file."""
+
+    def __enter__(self):
+        self.path = tempfile.mkdtemp()
+        return os.path.join(self.path, 'history.bin')
+
+    def __exit__(self, *exc_info):
+        shutil.rmtree(self.path)
+
+
+def test_round_trip():
+    with Directory() as path:
+        store = History(path)
+        stored = fill(store, RECORDS_PER_PAGE * 2 + 17)
+        assert store.records() == stored
+        store.close()
+        assert os.path.getsize(path) == 2 * PAGE_SIZE
+
+        store = History(path)
+        assert len(store) == len(stored)
+        assert store.records() == stored
+        assert store.records(stored[10][0], stored[500][0]) == stored[10:500]
+        assert store.verify() == []
+        store.close()
+
+
+def test_out_of_order():
+    with Directory() as path:
+        store = History(path)
+        store.append(START, 20, 1000, 50)
+        try:
+            store.append(START - 1, 20, 1000, 50)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Older sample accepted.')
+        store.close()
+
+
+def test_tail_recovery():
+    # Power loss after a sync: the partial page comes back from the tail
+    # file, samples after the sync are lost
+    with Directory() as path:
+        store = History(path)
+        stored = fill(store, RECORDS_PER_PAGE + 40)
+        store.sync()
+        store.append(stored[-1][0] + 10, 20, 1000, 50)
+        os.close(store._fd)
+
+        store = History(path)
+        assert store.records() == stored
+        store.close()
+
+
+def test_stale_tail_ignored():
+    # The page the tail file holds was completed and written since
+    with Directory() as path:
+        store = History(path)
+        stored = fill(store, 100)
+        store.sync()
+        stored += fill(store, RECORDS_PER_PAGE - 100, stored[-1][0] + 10, seed=1)
+        os.close(store._fd)
+
+        store = History(path)
+        assert store.pages == 1
+        assert store.records() == stored
+        store.close()
+
+
+def test_torn_last_page():
+    # Power loss while appending a page: it fails its CRC check and is
+    # dropped, the tail file still holds what was synced of it
+    with Directory() as path:
+        store = History(path)
+        stored = fill(store, RECORDS_PER_PAGE + 50)
+        store.sync()
+        fill(store, RECORDS_PER_PAGE - 50, stored[-1][0] + 10, seed=1)
+        os.close(store._fd)
+        with open(path, 'r+b') as f:
+            f.seek(-100, os.SEEK_END)
+            f.write(b'\xff' * 50)
+        # and a partial write after it
+        with open(path, 'ab') as f:
+            f.write(b'\0' * 1000)
+
+        store = History(path)
+        assert store.pages == 1
+        assert os.path.getsize(path) == PAGE_SIZE
+        assert store.records() == stored
+        assert store.verify() == []
+        store.close()
+
+
+def test_failed_page_write():
+    # A full disk fails the page write: the records stay buffered, and the
+    # page is written with the next sample once there is room again
+    with Directory() as path:
+        store = History(path)
+        write = os.write
+        failures = []
+
+        def failing_write(fd, data):
+            if len(data) == PAGE_SIZE and fd == store._fd and len(failures) < 2:
+                failures.append(fd)
+                write(fd, data[:1000])
+                raise OSError(28, 'No space left on device')
+            return write(fd, data)
+
+        history.os.write = failing_write
+        try:
+            stored = fill(store, RECORDS_PER_PAGE - 1)
+            for value in (20, 21):
+                t = stored[-1][0] + 10
+                stored.append((t,) + history.decode(history.encode(value, 1000, 50)))
+                try:
+                    store.append(t, value, 1000, 50)
+                except OSError:
+                    pass
+                else:
+                    raise AssertionError('Page write did not fail.')
+            assert len(failures) == 2 and store.pages == 0
+            assert store.records() == stored
+            # A tail save while more than a page is buffered
+            store.sync()
+            stored += fill(store, 10, stored[-1][0] + 10, seed=2)
+        finally:
+            history.os.write = write
+        assert store.pages == 1
+        assert store.records() == stored
+        assert store.verify() == []
+        store.close()
+
+        store = History(path)
+        assert store.records() == stored
+        store.close()
+
+
+def test_downsample_matches_records():
+    with Directory() as path:
+        store = History(path)
+        stored = fill(store, RECORDS_PER_PAGE * 6 + 123)
+        rng = random.Random(2)
+        for trial in range(50):
+            start = rng.randrange(START - 1000, stored[-1][0] + 1000)
+            end = start + rng.randrange(1, 40000)
+            buckets = rng.randrange(1, 20)
+            width = (end - start) / buckets
+            spans = store.downsample(start, end, buckets)
+            records = store.records(start, end)
+            for bucket, span in enumerate(spans):
+                inside = [record for record in records
+                          if min(int((record[0] - start) // width), buckets - 1) == bucket]
+                if not inside:
+                    assert span is None
+                    continue
+                assert (span.first, span.last, span.count) == \
+                    (inside[0][0], inside[-1][0], len(inside))
+                for k in range(3):
+                    assert span.min[k] == min(record[k + 1] for record in inside)
+                    assert span.max[k] == max(record[k + 1] for record in inside)
+        store.close()
+
+
+def test_downsample_uses_headers():
+    # A single bucket covering everything reads no stored records
+    with Directory() as path:
+        store = History(path)
+        stored = fill(store, RECORDS_PER_PAGE * 4)
+        unpack = history.unpack_records
+        calls = []
+        history.unpack_records = lambda *args: calls.append(args) or unpack(*args)
+        try:
+            span = store.span()
+        finally:
+            history.unpack_records = unpack
+        assert calls == []
+        assert span.count == len(stored)
+        assert span.min[0] == min(record[1] for record in stored)
+        store.close()
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Pages and show_page() on the HD44780 emulator. Checks what is in view, that
+the driver and the controller agree on the display shift, and that no
+instruction reaches the controller too early. Works as a plain script or
+under pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from RPLCD_i2c import CharLCD, ShiftMode, page
+from RPLCD_i2c.emulator import HD44780Emulator
+
+
+def display(rows=2, cols=16, **kwargs):
+    """Return a CharLCD on a fresh emulator, and the emulator."""
+    emulator = HD44780Emulator(rows, cols)
+    lcd = CharLCD(0x27, cols=cols, rows=rows, bus=emulator, **kwargs)
+    return lcd, emulator
+
+
+def draw_pages(lcd):
+    """Write the page number at the start of each page's rows."""
+    for number in range(lcd.pages):
+        with page(lcd, number):
+            for row in range(lcd.lcd.rows):
+                lcd.cursor_pos = (row, 0)
+                lcd.write_string('p{0}r{1}'.format(number, row))
+
+
+def expected(lcd, number):
+    return ['p{0}r{1}'.format(number, row).ljust(lcd.lcd.cols) for row in range(lcd.lcd.rows)]
+
+
+def test_page_count():
+    # A DDRAM line holds 40 cells on two line displays, 80 on one line ones
+    assert display(2, 16)[0].pages == 2
+    assert display(2, 8)[0].pages == 5
+    assert display(1, 16)[0].pages == 5
+    assert display(4, 20)[0].pages == 1
+
+
+def test_show_page():
+    lcd, emulator = display()
+    draw_pages(lcd)
+    assert emulator.lines() == expected(lcd, 0)
+    lcd.show_page(1)
+    assert emulator.lines() == expected(lcd, 1)
+    assert emulator.shift == lcd._shift == 16
+    assert lcd.visible_page == 1
+    # Drawing goes to page 0 still
+    assert lcd.page == 0
+    lcd.show_page(0)
+    assert emulator.lines() == expected(lcd, 0)
+    assert emulator.shift == lcd._shift == 0
+    assert emulator.violations == []
+
+
+def test_shortest_way_round():
+    # 5 pages of 8 columns: page 4 is 32 columns to the left, or 8 to the
+    # right across the end of the line
+    lcd, emulator = display(cols=8)
+    draw_pages(lcd)
+    assert lcd._page_shift(4) == 8
+    assert lcd._page_shift(1) == -8
+    assert lcd._page_shift(2) == -16
+    assert lcd._page_shift(3) == 16
+    sent = emulator.instructions
+    lcd.show_page(4)
+    assert emulator.instructions - sent == 8
+    assert emulator.lines() == expected(lcd, 4)
+    assert emulator.shift == lcd._shift == 32
+    assert lcd.visible_page == 4
+    # And back, wrapping the other way
+    assert lcd._page_shift(0) == -8
+    lcd.show_page(0)
+    assert emulator.lines() == expected(lcd, 0)
+    assert emulator.shift == lcd._shift == 0
+    assert emulator.violations == []
+
+
+def test_show_page_stepped():
+    lcd, emulator = display(cols=8)
+    draw_pages(lcd)
+    lcd.show_page(3, step_delay=0.001)
+    assert emulator.lines() == expected(lcd, 3)
+    assert emulator.shift == lcd._shift == 24
+    lcd.show_page(1, step_delay=0.001)
+    assert emulator.lines() == expected(lcd, 1)
+    assert emulator.violations == []
+
+
+def test_show_page_flushes_framebuffer():
+    lcd, emulator = display(framebuffer=True)
+    draw_pages(lcd)
+    lcd.show_page(1)
+    assert emulator.lines() == expected(lcd, 1)
+    assert emulator.violations == []
+
+
+def test_shift_tracked_in_display_shift_mode():
+    # Each character written shifts the display by one column
+    lcd, emulator = display()
+    lcd.write_shift_mode = ShiftMode.display
+    lcd.write_string('abc')
+    assert emulator.shift == lcd._shift == 3
+    lcd.write(ord('d'))
+    assert emulator.shift == lcd._shift == 4
+    assert lcd.visible_page is None
+    lcd.show_page(0)
+    assert emulator.shift == lcd._shift == 0
+    assert lcd.visible_page == 0
+    assert emulator.lines()[0] == 'abcd'.ljust(16)
+    lcd.home()
+    assert emulator.shift == lcd._shift == 0
+    assert emulator.violations == []
+
+
+def test_invalid_page():
+    lcd, emulator = display()
+    for number in (-1, 2):
+        try:
+            lcd.show_page(number)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Page {0} accepted.'.format(number))
+        try:
+            lcd.page = number
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Page {0} accepted.'.format(number))
+    assert lcd.page == 0
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Rolling statistics of the sampler. Works as a plain script or under pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+import random
+
+import bme280
+import sampler
+
+try:
+    range = xrange
+except NameError:
+    pass
+
+
+START = 1.7e9  # epoch timestamps, as the sampler sees them
+
+
+class FakeSensor(object):
+    """Sensor compensating any data into the values set last."""
+
+    values = None
+
+    def compensate(self, data):
+        return self.values
+
+
+def feed(channel, sensor, t, values):
+    sensor.values = values
+    return channel.add(t, [0] * 8)
+
+
+def test_trend_of_ramp():
+    # 0.001 C/s every 10s, the first samples, a full window, and well past
+    # the buffer wrapping around
+    sensor = FakeSensor()
+    channel = sampler.Channel(sensor, 360)
+    for i in range(1000):
+        t = START + 10 * i
+        aggregate = feed(channel, sensor, t, (20 + 0.001 * (t - START), 1000.0, 50.0))
+        if i == 0:
+            assert aggregate.temperature.trend == 0.0
+        else:
+            assert abs(aggregate.temperature.trend - 0.001) < 1e-9, (i, aggregate.temperature)
+        assert abs(aggregate.pressure.trend) < 1e-12
+    assert aggregate.count == 360
+
+
+def test_constant_values():
+    sensor = FakeSensor()
+    channel = sampler.Channel(sensor, 50)
+    for i in range(120):
+        aggregate = feed(channel, sensor, START + 10 * i, (21.5, 1013.25, 40.0))
+        for stats in aggregate[3:]:
+            assert abs(stats.trend) < 1e-12
+            assert stats.min == stats.max == stats.latest
+            assert abs(stats.mean - stats.latest) < 1e-9
+
+
+def test_window_statistics():
+    rng = random.Random(0)
+    sensor = FakeSensor()
+    channel = sampler.Channel(sensor, 50)
+    samples = []
+    for i in range(300):
+        t = START + 10 * i + rng.random()
+        values = (rng.uniform(-10, 40), rng.uniform(950, 1050), rng.uniform(0, 100))
+        samples.append((t, values))
+        aggregate = feed(channel, sensor, t, values)
+        window = samples[-50:]
+        for k, stats in enumerate(aggregate[3:]):
+            ys = [v[k] for t, v in window]
+            assert stats.latest == ys[-1]
+            assert stats.min == min(ys) and stats.max == max(ys)
+            assert abs(stats.mean - sum(ys) / len(ys)) < 1e-9
+            if len(window) > 1:
+                xs = [t for t, v in window]
+                mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+                slope = (sum((x - mx) * (y - my) for x, y in zip(xs, ys)) /
+                         sum((x - mx) ** 2 for x in xs))
+                assert abs(stats.trend - slope) < 1e-6 * max(1, abs(slope))
+
+
+class StreamingSensor(FakeSensor):
+    """Sensor in normal mode, reads always succeed."""
+
+    mode = bme280.MODE_NORMAL
+    values = (21.0, 1000.0, 45.0)
+
+    def collectRaw(self, wait=True):
+        return [0] * 8
+
+
+class FailingStore(object):
+    def __init__(self):
+        self.attempts = 0
+
+    def append(self, timestamp, temperature, pressure, humidity):
+        self.attempts += 1
+        raise OSError(28, 'No space left on device')
+
+
+def test_store_failure_keeps_sampling():
+    store = FailingStore()
+    instance = sampler.Sampler(StreamingSensor(), window=10, store=store)
+    for i in range(3):
+        instance.sample()
+    aggregate = instance.latest()
+    assert store.attempts == 3
+    assert aggregate.count == 3
+    assert aggregate.errors == 3
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Transitions on the HD44780 emulator: the display contents and shift after
+playing them, and after single frames. Works as a plain script or under
+pytest.
+
+"""
+from __future__ import print_function, division, absolute_import, unicode_literals
+
+from RPLCD_i2c import CharLCD, Fade, Marquee, Slide, Wipe, page
+from RPLCD_i2c.emulator import HD44780Emulator
+
+# Fast enough to drop frames, the last one is drawn anyway
+FPS = 1000
+
+
+def display(rows=2, cols=16, **kwargs):
+    """Return a CharLCD on a fresh emulator, and the emulator."""
+    emulator = HD44780Emulator(rows, cols)
+    lcd = CharLCD(0x27, cols=cols, rows=rows, bus=emulator, **kwargs)
+    return lcd, emulator
+
+
+def draw(transition, frame, previous=-1):
+    """Draw a single frame, the way ``Transition.play`` does."""
+    lcd = transition.lcd
+    with lcd._lock, lcd._batched():
+        transition._draw(frame, previous)
+    lcd.flush()
+
+
+def check_stats(stats, frames):
+    assert stats.frames == frames
+    assert stats.shown + stats.dropped == frames
+    assert 1 <= stats.shown <= frames
+    assert stats.target_fps == FPS
+
+
+def test_slide():
+    lcd, emulator = display(framebuffer=True)
+    lcd.write_string('front')
+    with page(lcd, 1):
+        lcd.cursor_pos = (0, 0)
+        lcd.write_string('back')
+    # Not flushed yet, Slide does it before shifting
+    check_stats(Slide(lcd, 1).play(FPS), 16)
+    assert emulator.lines() == ['back'.ljust(16), ' ' * 16]
+    assert emulator.shift == lcd._shift == 16
+    assert lcd.visible_page == 1
+    check_stats(Slide(lcd, 0).play(FPS), 16)
+    assert emulator.lines() == ['front'.ljust(16), ' ' * 16]
+    assert emulator.shift == lcd._shift == 0
+    assert emulator.violations == []
+
+
+def test_slide_flushes_first():
+    lcd, emulator = display(framebuffer=True)
+    with page(lcd, 1):
+        lcd.write_string('back')
+    shifts = []
+
+    class CheckedSlide(Slide):
+        def _draw(self, frame, previous):
+            # The page is complete before it starts coming into view
+            shifts.append(emulator.shift)
+            assert emulator.ddram[16:20] == bytearray(b'back')
+            super(CheckedSlide, self)._draw(frame, previous)
+
+    CheckedSlide(lcd, 1).play(FPS)
+    assert shifts[0] == 0
+    assert emulator.violations == []
+
+
+def test_slide_frames():
+    # 5 pages of 8 columns, page 4 is 8 columns to the right
+    lcd, emulator = display(cols=8)
+    slide = Slide(lcd, 4)
+    assert slide.frames == 8
+    draw(slide, 2)
+    assert emulator.shift == lcd._shift == 37
+    assert lcd.visible_page is None
+    draw(slide, 7, 2)
+    assert emulator.shift == lcd._shift == 32
+    assert lcd.visible_page == 4
+    # Already in view
+    assert Slide(lcd, 4).frames == 0
+    assert emulator.violations == []
+
+
+def test_wipe():
+    lcd, emulator = display()
+    lcd.write_string('old first line\r\nold second line')
+    wipe = Wipe(lcd, ['New first line', 'New second'])
+    assert wipe.frames == 16
+    draw(wipe, 3)
+    assert emulator.lines() == ['New first line'[:4] + 'old first line'[4:].ljust(12),
+                                'New ' + 'second line'.ljust(12)]
+    check_stats(Wipe(lcd, ['New first line', 'New second']).play(FPS), 16)
+    assert emulator.lines() == ['New first line'.ljust(16), 'New second'.ljust(16)]
+    assert emulator.shift == 0
+    assert emulator.violations == []
+
+
+def test_wipe_reverse():
+    lcd, emulator = display(framebuffer=True)
+    lcd.write_string('x' * 32)
+    lcd.flush()
+    wipe = Wipe(lcd, ['abcdefghijklmnop'], reverse=True)
+    draw(wipe, 4)
+    assert emulator.lines() == ['x' * 11 + 'lmnop', 'x' * 16]
+    draw(wipe, 15, 4)
+    assert emulator.lines() == ['abcdefghijklmnop', 'x' * 16]
+    assert emulator.violations == []
+
+
+def test_marquee():
+    lcd, emulator = display()
+    lcd.write_string('title')
+    marquee = Marquee(lcd, 'Hi there', row=1)
+    # Enters on the right, leaves on the left
+    assert marquee.frames == len('Hi there') + 16
+    draw(marquee, 0)
+    assert emulator.lines() == ['title'.ljust(16), ' ' * 15 + 'H']
+    draw(marquee, 15, 0)
+    assert emulator.lines()[1] == 'Hi there'.ljust(16)
+    draw(marquee, 17, 15)
+    assert emulator.lines()[1] == ' there'.ljust(16)
+    check_stats(Marquee(lcd, 'Hi there', row=1).play(FPS), 24)
+    assert emulator.lines() == ['title'.ljust(16), ' ' * 16]
+    assert emulator.violations == []
+
+
+def test_marquee_on_other_page():
+    lcd, emulator = display()
+    with page(lcd, 1):
+        marquee = Marquee(lcd, 'Hi')
+    draw(marquee, 15)
+    assert emulator.lines() == [' ' * 16] * 2
+    lcd.show_page(1)
+    assert emulator.lines()[0] == 'Hi'.ljust(16)
+    assert emulator.violations == []
+
+
+def test_fade():
+    lcd, emulator = display()
+    check_stats(Fade(lcd, frames=20).play(FPS), 20)
+    assert not emulator.backlight
+    check_stats(Fade(lcd, fade_in=True, frames=20).play(FPS), 20)
+    assert emulator.backlight
+    assert emulator.violations == []
+
+
+if __name__ == '__main__':
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(name, 'OK')